@@ -1,14 +1,9 @@
-from cProfile import label
-import numpy as np
 import streamlit as st
 import pandas as pd
-import altair as alt
-import plotly.express as px
-import pydeck as pdk  # For map visualization
-import geopandas as gpd
-import geojson 
-import folium
-from streamlit_folium import st_folium
+import datacache
+import geostore
+import geojsonwriter
+import ranking
 
 # Page configuration
 st.set_page_config(
@@ -52,7 +47,8 @@ st.markdown("""
 #######################
 # Load data
 #df_meta = pd.read_csv('meta.csv')
-df_indicators = pd.read_csv('indicatoren.csv', delimiter=';')
+df_indicators = datacache.read_csv('indicatoren.csv', delimiter=';')
+ranking_index = ranking.load_ranking('indicatoren.csv', delimiter=';')
 
 #######################
 # Sidebar
@@ -78,6 +74,8 @@ with st.sidebar:
 
 # Heatmap
 def make_heatmap(df_reshaped, input_y, input_x, input_color, input_color_theme):
+    import altair as alt
+
     heatmap = alt.Chart(input_y).mark_rect().encode(
             y=alt.Y(f'{input_y}:O', axis=alt.Axis(title="Year", titleFontSize=18, titlePadding=15, titleFontWeight=900, labelAngle=0)),
             x=alt.X(f'{input_x}:O', axis=alt.Axis(title="", titleFontSize=18, titlePadding=15, titleFontWeight=900)),
@@ -95,8 +93,6 @@ def make_heatmap(df_reshaped, input_y, input_x, input_color, input_color_theme):
     return heatmap
 
 # Choropleth map
-import plotly.express as px
-
 def make_choropleth(df_reshaped, geojson, input_column, selected_color_theme):
     """
     Create a choropleth for regions in the Netherlands.
@@ -111,6 +107,8 @@ def make_choropleth(df_reshaped, geojson, input_column, selected_color_theme):
     Returns:
         plotly.graph_objs._figure.Figure: The choropleth map.
     """
+    import plotly.express as px
+
     choropleth = px.choropleth(
         df_reshaped,
         geojson=geojson,
@@ -137,6 +135,8 @@ def make_choropleth(df_reshaped, geojson, input_column, selected_color_theme):
 
 # Donut chart
 def make_donut(input_response, input_text, input_color):
+  import altair as alt
+
   if input_color == 'blue':
       chart_color = ['#29b5e8', '#155F7A']
   if input_color == 'green':
@@ -419,18 +419,11 @@ with col[1]:
 with col[2]:
     st.expander('About', expanded=True)
 
-    # Filter rows based on label and year
-    df_selectedindicator = df_indicators[
-        (df_indicators['label'] == selected_indicator) &  # Filter by label
-        (df_indicators['jaar'] == df_indicators['jaar'].max())
-    ]
+    # Rows of the selected indicator in the latest year, pre-sorted by value
     # Ensure the resulting dataset includes the 'label', 'jaar', and 'waarde' columns
     columns_to_include = ['label', 'jaar', 'waarde','statnaam']
-    df_selectedindicator = df_selectedindicator[columns_to_include]
-
-    df_selectedindicator_sorted = df_selectedindicator.sort_values(by='waarde', ascending=True)
-
-    df_selectedindicator_sorted = df_selectedindicator_sorted[columns_to_include]
+    df_selectedindicator_sorted = ranking_index.sorted_frame(selected_indicator)[columns_to_include]
+    df_selectedindicator = df_selectedindicator_sorted
 
     st.markdown('#### Gemeenten gerangschikt van hoog naar laag in Tevredenheid met het Leven')
 
@@ -464,16 +457,23 @@ df_gd = df_selectedindicator[
         (df_selectedindicator['statnaam'].isin(['Groningen', 'Drenthe']))  # Filter by statnaam
     ]
 
+import folium
+from streamlit_folium import st_folium
+
+# Both province maps share the zoom level, which also picks the geometry detail
+folium_zoom = 10
+
 #Groningen map
 with col1[0]:
     st.markdown('**Groningen**')
-   # Load GeoJSON
-    geojson_file = "Indicator_01_KL_OK_11.geojson"
-    with open(geojson_file) as f:
-        geojson_data = geojson.load(f)
+   # Municipality boundaries simplified for the map's zoom level
+    geojson_data = geojsonwriter.feature_collection(
+        geojsonwriter.encoded_geometry(zoom=folium_zoom),
+        statnaam=geostore.load_geometry()["statnaam"].to_numpy(),
+    )
 
     # Center map on an initial location (change coordinates as needed)
-    m = folium.Map(location=[53.2194, 6.5665], zoom_start=10)  # Example: Amsterdam
+    m = folium.Map(location=[53.2194, 6.5665], zoom_start=folium_zoom)  # Example: Amsterdam
 
     # Add GeoJSON to the map
     folium.GeoJson(geojson_data, name="geojson").add_to(m)
@@ -484,13 +484,14 @@ with col1[0]:
 # Drenthe map
 with col1[1]:
     st.markdown('**Drenthe**')
-   # Load GeoJSON
-    geojson_file = "Indicator_01_KL_OK_11.geojson"
-    with open(geojson_file) as f:
-        geojson_data = geojson.load(f)
+   # Municipality boundaries simplified for the map's zoom level
+    geojson_data = geojsonwriter.feature_collection(
+        geojsonwriter.encoded_geometry(zoom=folium_zoom),
+        statnaam=geostore.load_geometry()["statnaam"].to_numpy(),
+    )
 
     # Center map on an initial location (change coordinates as needed)
-    m = folium.Map(location=[52.9476, 6.6231], zoom_start=10)  
+    m = folium.Map(location=[52.9476, 6.6231], zoom_start=folium_zoom)  
 
     # Add GeoJSON to the map
     folium.GeoJson(geojson_data, name="geojson").add_to(m)
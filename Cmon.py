@@ -1,18 +1,8 @@
-from cProfile import label
-import numpy as np
-import streamlit as st
-import pandas as pd
-import altair as alt
-import pydeck as pdk  # For map visualization
-import geopandas as gpd
 import os
-import matplotlib.pyplot as plt
-from dutchdict import Themes
-from test_dutch import file_options 
-import folium
-from folium.plugins import HeatMap
-from streamlit.components.v1 import iframe
-import json
+
+import streamlit as st
+import registry
+from registry import file_options
 
 # Page configuration
 st.set_page_config(
@@ -20,11 +10,33 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded")
 
+# Pick up year columns added by ingest.py since the last run
+registry.refresh()
+
 # Check the query parameter to determine which page to display
 query_params = st.query_params 
-page = query_params.get("page", ["home"])[0]
+page = query_params.get("page", "home")
 
 if page == "home":
+    # Heavy imports are only paid for by the page that needs them
+    import pandas as pd
+    import pydeck as pdk  # For map visualization
+    import autocorr
+    import datacache
+    import export
+    import geostore
+    import indicatorcube
+    import classify
+    import geojsonwriter
+    import maptransport
+    import metrics
+    import ranking
+    import rollups
+    import spatialindex
+    import themes
+
+    metrics.start_run()
+
     st.markdown("""
     <div style='text-align: left; padding: 10px;'>
         <h1 style='color: #eb1d9c; font-size: 48px; font-weight: bold; margin-bottom: 0;'> cmo stamm.</h1>
@@ -65,8 +77,11 @@ if page == "home":
     #######################
     # Load data
     #df_meta = pd.read_csv('meta.csv')
-    df_indicators = pd.read_csv('indmaarmunn.csv')
-    df_thema = pd.read_excel('thematicpath.xlsx')
+    with metrics.span("load_data"):
+        df_indicators = datacache.read_csv('indmaarmunn.csv')
+        ranking_index = ranking.load_ranking('indmaarmunn.csv')
+        df_thema = datacache.read_excel('thematicpath.xlsx')
+        theme_scores = themes.load_scores()
 
     #######################
     # Sidebar
@@ -86,101 +101,312 @@ if page == "home":
             options = file_options
     
 
+        # Changing the indicator reruns the whole page; the year and classification
+        # live in the map fragment so they only redraw the map
         selected_indicator = st.selectbox("Select a Theme/an Indicator:", options)
 
         jaar = df_indicators['jaar'].dropna().unique().tolist()
-        # Dropdown menu for selecting the year
-        file_info = file_options[selected_indicator]
-        year_columns = file_info["year_columns"]
-        selected_year = st.selectbox("Selecteer een jaar:", list(year_columns.keys()))
+
+        # What-if weighting of the indicators of a computed theme; None keeps the standard weights
+        theme_weights = None
+        if selected_indicator in theme_scores and st.toggle("Weging aanpassen"):
+            st.caption("Hoe zwaar telt elke indicator mee in het thema?")
+            theme_weights = {
+                name: st.slider(name, 0.0, 3.0, 1.0, 0.1, key=f"weight:{selected_indicator}:{name}")
+                for name in theme_scores.members[selected_indicator]
+            }
+
+    # Stage times of the previous rerun, only with CMON_METRICS=1
+    metrics.render_sidebar(st.session_state.get("metrics_run"))
        
     #######################
     # Dashboard Main Panel
-    col0 = st.columns((5, 3), gap='medium')
+    # Fragments rerun on their own when one of their widgets changes; their
+    # arguments are the sidebar inputs they depend on.
+
+    @st.fragment
+    def map_fragment(selected_indicator, theme_weights):
+        owns_run = metrics.start_run(join=True)
 
-    with col0[0]:
         #Extract path, year_columns, and title based on selection
+        file_info = file_options[selected_indicator]
+        year_columns = file_info["year_columns"]
         indicator_path = file_info["path"]
         title_base = file_info["title"]
 
-        # Load the selected file
-        indicator = gpd.read_file(indicator_path)
-
-        # Get the column corresponding to the selected year
-        selected_column = year_columns[selected_year]
+        # Themes are computed from their indicators, for every year any of them has data;
+        # loaded here like the cube, so a fragment rerun after a data refresh sees both
+        with metrics.span("themes"):
+            theme_scores = themes.load_scores()
+        computed_theme = selected_indicator in theme_scores
+        year_options = (
+            theme_scores.available_years(selected_indicator) if computed_theme else list(year_columns.keys())
+        )
 
-        # **2. Interactive pydeck Map**
-        # Ensure geometry is valid
-        indicator = indicator[indicator.geometry.notnull()]
+        # Dropdown menus for selecting the year, the classification and, with a region
+        # lookup file, the aggregation level
+        year_col, scheme_col, level_col = st.columns(3)
+        selected_year = year_col.selectbox("Selecteer een jaar:", year_options)
+        schemes = {**classify.SCHEMES, autocorr.SCHEME: autocorr.SCHEME_LABEL}
+        selected_scheme = scheme_col.selectbox("Klassenindeling:", list(schemes), format_func=schemes.get)
+        selected_level = "gemeente"
+        if rollups.available():
+            levels = {"gemeente": "Gemeenten", **rollups.LEVELS}
+            selected_level = level_col.selectbox("Niveau:", list(levels), format_func=levels.get)
 
         # Get the column corresponding to the selected year
-        selected_column = year_columns[selected_year]
-
-        # Convert non-JSON serializable types (e.g., Timestamps) to strings
-        for column in indicator.columns:
-            if pd.api.types.is_datetime64_any_dtype(indicator[column]):
-                indicator[column] = indicator[column].dt.strftime('%Y-%m-%d')
-
-        # Handle missing values: Set them to NaN and assign them a white color later
-        indicator[selected_column] = pd.to_numeric(indicator[selected_column], errors='coerce')
-
-        # Calculate quantiles
-        quantiles = indicator[selected_column].quantile([0.0, 0.25, 0.5, 0.75, 1.0]).values
-
-        # Function to assign colors based on quantile
-        def get_color(value):
-            if pd.isna(value):
-                return [255, 255, 255]  # White for missing values
-            elif value <= quantiles[1]:  # 0-25% quantile range
-                return [255, 0, 0]  # Red
-            elif value <= quantiles[2]:  # 25-50% quantile range
-                return [255, 165, 0]  # Orange
-            elif value <= quantiles[3]:  # 50-75% quantile range
-                return [255, 255, 0]  # Yellow
-            else:  # 75-100% quantile range
-                return [0, 255, 0]  # Green
-
-        # Apply the color function to each feature
-        indicator["fill_color"] = indicator[selected_column].apply(get_color)
-
-        # Prepare data for hover interaction
-        indicator["hover_info"] = indicator.apply(lambda row: f"{row['statnaam']}: {row[selected_column]}", axis=1)
+        selected_column = year_columns.get(selected_year, f"Year{selected_year}")
 
-        # Add hover functionality using Streamlit
-        indicator = indicator.to_crs(epsg=4326)  # Ensure GeoDataFrame is in WGS84 for PyDeck
-
-        # Serialize GeoJSON manually to handle custom hover_info and fill_color
-        geojson_data = json.loads(indicator.to_json())
-        for feature, hover_text, fill_color in zip(geojson_data["features"], indicator["hover_info"], indicator["fill_color"]):
-            feature["properties"]["hover_info"] = hover_text
-            feature["properties"]["fill_color"] = fill_color
-
-        # Create PyDeck layer with dynamic colors
-        layer = pdk.Layer(
-            "GeoJsonLayer",
-            data=geojson_data,
+        # **2. Interactive pydeck Map**
+        # Shared municipality geometry with the selected values from the indicator cube,
+        # missing values are NaN and get a white color later
+        with metrics.span("geometry"):
+            wgs84 = geostore.load_geometry_wgs84()
+        with metrics.span("cube"):
+            cube = indicatorcube.load_cube()
+        indicator = wgs84.boundaries.copy()
+        if computed_theme and theme_weights is not None and selected_year in theme_scores.years:
+            # One matrix-vector product over all municipalities and years
+            with metrics.span("reweight"):
+                scores = theme_scores.weighted(selected_indicator, theme_weights)
+            indicator[selected_column] = scores[:, theme_scores.years.index(selected_year)]
+        elif computed_theme:
+            indicator[selected_column] = theme_scores.values(selected_indicator, selected_year)
+        else:
+            indicator[selected_column] = cube.values(selected_indicator, selected_year)
+        metrics.count("rows", len(indicator))
+
+        if indicator[selected_column].isna().all():
+            st.warning("Geen gegevens beschikbaar voor de geselecteerde indicator.")
+
+        if selected_level != "gemeente":
+            # Precomputed weighted means per region, on boundaries dissolved once per geometry version
+            with metrics.span("rollup"):
+                rollup = rollups.load_rollup(selected_level)
+                region_values = (
+                    rollup.aggregate(indicator[selected_column].to_numpy()) if computed_theme
+                    else rollup.values(selected_indicator, selected_year)
+                )
+                indicator = pd.DataFrame(
+                    {"statcode": rollup.names, "statnaam": rollup.names, selected_column: region_values}
+                )
+            if selected_scheme == autocorr.SCHEME:
+                st.caption("Clusters zijn alleen beschikbaar voor gemeenten; de kaart toont kwantielen.")
+                selected_scheme = "quantile"
+
+        # Classify the whole column at once; missing values are white
+        with metrics.span("classify"):
+            if selected_scheme == autocorr.SCHEME:
+                # Significant LISA clusters, precomputed for the cube; theme scores and cube
+                # columns without up-to-date results are computed for this column alone
+                hotspot_results = None if computed_theme else autocorr.load_results()
+                clusters = None if hotspot_results is None else hotspot_results.cluster_codes(
+                    selected_indicator, selected_year
+                )
+                if clusters is None:
+                    clusters = autocorr.hotspots(indicator[selected_column].to_numpy())
+                colors = autocorr.cluster_colors(clusters)
+            else:
+                breaks, colors = classify.class_colors(indicator[selected_column].to_numpy(), scheme=selected_scheme)
+        if selected_scheme == autocorr.SCHEME:
+            st.caption(" · ".join(
+                f'<span style="color: rgb{color}">■</span> {label}' for label, color in autocorr.CLUSTERS.values()
+            ) + f" (p ≤ {autocorr.SIGNIFICANCE})", unsafe_allow_html=True)
+            if hotspot_results is not None:
+                moran_i, moran_p = hotspot_results.global_moran(selected_indicator, selected_year)
+                if moran_i == moran_i:
+                    st.caption(f"Moran's I: {moran_i:.2f} (p = {moran_p:.3f})")
+
+        map_zoom = 6
+        view_state = pdk.ViewState(
+            latitude=wgs84.center[0],
+            longitude=wgs84.center[1],
+            zoom=map_zoom
+        )
+        layer_style = dict(
+            id="municipalities" if selected_level == "gemeente" else "regions",
             pickable=True,
-            get_fill_color="properties.fill_color",
             get_line_color="[255, 255, 255]",
             line_width_min_pixels=1,
             auto_highlight=True,
         )
 
-        # Create PyDeck map
-        view_state = pdk.ViewState(
-            latitude=indicator.geometry.centroid.y.mean(),
-            longitude=indicator.geometry.centroid.x.mean(),
-            zoom=6
+        # Prepare data for hover interaction
+        hover_info = indicator["statnaam"] + ": " + indicator[selected_column].astype(str)
+
+        if selected_level == "gemeente" and st.get_option("server.enableStaticServing"):
+            # The browser fetches the static geometry file once; a rerun only sends
+            # the color table and the hover texts
+            with metrics.span("payload"):
+                url = maptransport.geometry_url(map_zoom)
+                layer = maptransport.color_layer(url, colors, **layer_style)
+                tooltip = maptransport.hover_tooltip(hover_info.tolist())
+            r = pdk.Deck(layers=[layer], initial_view_state=view_state, tooltip=tooltip)
+        else:
+            # Write the GeoJSON in one pass from the cached geometry and the per-feature properties,
+            # with the boundaries simplified for the map's zoom level
+            with metrics.span("payload"):
+                geometries = (
+                    geojsonwriter.encoded_geometry(zoom=map_zoom) if selected_level == "gemeente"
+                    else rollups.encoded_geometry(selected_level, zoom=map_zoom)
+                )
+                geojson_data = geojsonwriter.feature_collection(
+                    geometries,
+                    statcode=indicator["statcode"].to_numpy(),
+                    hover_info=hover_info.to_numpy(),
+                    fill_color=colors,
+                )
+
+            # Create PyDeck layer with dynamic colors
+            layer = pdk.Layer(
+                "GeoJsonLayer",
+                data="municipalities",
+                get_fill_color="properties.fill_color",
+                **layer_style,
+            )
+            r = geojsonwriter.RawDataDeck(
+                layers=[layer],
+                initial_view_state=view_state,
+                tooltip={"html": "<b>{hover_info}</b>"},
+                raw_data={"municipalities": geojson_data},
+            )
+
+        if metrics.ENABLED:
+            # Serializes the spec a second time, so only when measuring
+            metrics.count("payload_bytes", len(r.to_json()))
+
+        # Display the map with Streamlit; covers serializing the spec and queueing it
+        # for the websocket, not the send itself
+        with metrics.span("pydeck_chart"):
+            event = st.pydeck_chart(r, on_select="rerun", selection_mode="single-object")
+
+        # Profile of a clicked municipality, or of the one at the entered coordinates;
+        # features are in the statcode order of the cube, so the index is the position
+        clicked = event.selection["indices"].get("municipalities", [])
+        if clicked:
+            st.session_state["profile_position"] = clicked[0]
+        coordinates = st.text_input("Zoek een gemeente op coördinaten (lat, lon):", placeholder="53.219, 6.567")
+        if coordinates:
+            try:
+                lat, lon = (float(part) for part in coordinates.split(","))
+            except ValueError:
+                st.warning("Vul de coördinaten in als 'lat, lon', bijvoorbeeld 53.219, 6.567.")
+            else:
+                position = spatialindex.load_index().lookup([lon], [lat])[0]
+                if position < 0:
+                    st.warning("Deze coördinaten liggen niet in een Nederlandse gemeente.")
+                else:
+                    st.session_state["profile_position"] = int(position)
+        position = st.session_state.get("profile_position")
+        if position is not None and position < len(cube.statcodes):
+            statnaam = wgs84.boundaries["statnaam"].iloc[position]
+            with st.expander(f"Gemeenteprofiel: {statnaam}", expanded=True):
+                st.dataframe(
+                    pd.DataFrame(cube.profile(position), columns=["indicator", "jaar", "waarde"]),
+                    hide_index=True,
+                )
+
+        if owns_run:
+            st.session_state["metrics_run"] = metrics.end_run()
+
+    @st.fragment
+    def ranking_fragment(selected_indicator, theme_weights):
+        owns_run = metrics.start_run(join=True)
+        descending = st.toggle("Van hoog naar laag", value=True)
+
+        # Rows of the selected indicator in the latest year, pre-sorted by value
+        with metrics.span("ranking"):
+            theme_scores = themes.load_scores()
+            theme_years = theme_scores.available_years(selected_indicator)
+            if theme_years:
+                # Computed themes rank on their (re)weighted scores of the latest year
+                scores = theme_scores.weighted(selected_indicator, theme_weights or {})
+                df_selectedindicator_sorted = pd.DataFrame({
+                    "statnaam": geostore.load_geometry()["statnaam"].to_numpy(),
+                    "waarde": scores[:, theme_scores.years.index(theme_years[-1])],
+                }).sort_values("waarde", ascending=not descending, na_position="last", kind="stable")
+            else:
+                df_selectedindicator_sorted = ranking_index.sorted_frame(selected_indicator, ascending=not descending)
+
+        #df_selectedindicator_sorted = df_selectedindicator_sorted[columns_to_include]
+
+        order = "hoog naar laag" if descending else "laag naar hoog"
+        st.markdown(f'**Gemeenten gerangschikt van {order} in {selected_indicator}**')
+
+        if df_selectedindicator_sorted.empty:
+                st.warning("Geen gegevens beschikbaar voor de geselecteerde indicator.")
+        else:
+            # Display the DataFrame using Streamlit
+            st.dataframe(
+            df_selectedindicator_sorted, 
+            column_order=("statnaam", "waarde"), 
+            hide_index=True, 
+            width=None, 
+            column_config={
+                "statnaam": st.column_config.TextColumn(
+                    "Statnaam",
+                ),
+                "waarde": st.column_config.TextColumn(
+                    "Waarde",  # This will now display as plain numbers
+                ),
+            }
         )
 
-        r = pdk.Deck(layers=[layer], initial_view_state=view_state, tooltip={"html": "<b>{hover_info}</b>"})
+        if owns_run:
+            st.session_state["metrics_run"] = metrics.end_run()
+
+    @st.fragment
+    def export_fragment():
+        # Bulk export of the cube; the selection widgets only rerun this fragment
+        with st.expander("Data exporteren"):
+            cube = indicatorcube.load_cube()
+            export_indicators = st.multiselect("Indicatoren (leeg = alle):", cube.indicators)
+            export_years = st.multiselect("Jaren (leeg = alle):", cube.years)
+            export_provinces = []
+            if rollups.available():
+                export_provinces = st.multiselect(
+                    "Provincies (leeg = alle):", sorted(rollups.load_regions()["provincie"].unique())
+                )
+            export_municipalities = st.multiselect(
+                "Gemeenten (leeg = alle):", sorted(geostore.load_geometry()["statnaam"])
+            )
+            formats = {"csv": "CSV", "parquet": "Parquet", "gpkg": "GeoPackage"}
+            export_format = st.radio("Formaat:", list(formats), format_func=formats.get, horizontal=True)
+            with_geometry = st.checkbox("Met gemeentegrenzen", value=export_format == "gpkg")
+
+            request = (export_indicators, export_years, export_provinces, export_municipalities,
+                       export_format, with_geometry)
+            if st.button("Export maken"):
+                try:
+                    selection = export.Selection(
+                        cube, export_indicators, export_years, export_municipalities, export_provinces
+                    )
+                    # Written in chunks to a file on disk; the session only keeps its path
+                    path = export.export_file(selection, export_format, geometry=with_geometry)
+                except (ValueError, FileNotFoundError, ImportError) as e:
+                    st.error(f"Export mislukt: {e}")
+                else:
+                    previous = st.session_state.get("export_file")
+                    if previous is not None and os.path.exists(previous[2]):
+                        os.remove(previous[2])
+                    file_name = f"brede-welvaart{export.FORMATS[export_format]}"
+                    st.session_state["export_file"] = (request, file_name, path)
+            exported = st.session_state.get("export_file")
+            if exported is not None and exported[0] == request and os.path.exists(exported[2]):
+                with open(exported[2], "rb") as f:
+                    st.download_button(f"Download {exported[1]}", f, file_name=exported[1])
 
-        # Display the map with Streamlit
-        st.pydeck_chart(r)
+    col0 = st.columns((5, 3), gap='medium')
+
+    with col0[0]:
+        map_fragment(selected_indicator, theme_weights)
 
     if st.button("map download", key="mapdownload"):
-        # Set query parameter to "home" to redirect back to the home page
-        st.query_params(page="mapdownload")
+        # Set query parameter to "mapdownload" to open the map download page
+        st.query_params["page"] = "mapdownload"
+        st.rerun()
+
+    export_fragment()
         
     st.write("Welkom bij het hoofddashboard. Gebruik de knop hierboven om te navigeren.")
             
@@ -205,36 +431,20 @@ if page == "home":
             st.markdown({selected_indicator})
 
         st.expander('About', expanded=True)
-        # Filter rows based on label and year
-        df_selectedindicator = df_indicators[
-            (df_indicators['label'] == selected_indicator) &  # Filter by label
-            (df_indicators['jaar'] == df_indicators['jaar'].max())
-        ]
-
-        df_selectedindicator_sorted = df_selectedindicator.sort_values(by='waarde', ascending=True)
-
-        #df_selectedindicator_sorted = df_selectedindicator_sorted[columns_to_include]
-
-        st.markdown(f'**Gemeenten gerangschikt van hoog naar laag in {selected_indicator}**')
+        ranking_fragment(selected_indicator, theme_weights)
 
-        if df_selectedindicator_sorted.empty:
-                st.warning("Geen gegevens beschikbaar voor de geselecteerde indicator.")
-        else:
-            # Display the DataFrame using Streamlit
-            st.dataframe(
-            df_selectedindicator_sorted, 
-            column_order=("statnaam", "waarde"), 
-            hide_index=True, 
-            width=None, 
-            column_config={
-                "statnaam": st.column_config.TextColumn(
-                    "Statnaam",
-                ),
-                "waarde": st.column_config.TextColumn(
-                    "Waarde",  # This will now display as plain numbers
-                ),
-            }
-        )
         with st.expander('About', expanded=True):
             st.write('''
                 - Data: [CBS data: Nederland (https://www.cbs.nl/nl-nl/visualisaties/regionale-monitor-brede-welvaart/indicator)]''')
+
+    st.session_state["metrics_run"] = metrics.end_run()
+
+elif page == "mapdownload":
+    import mapdownload
+
+    mapdownload.render()
+
+elif page == "debug":
+    import importprofile
+
+    importprofile.render()
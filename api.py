@@ -0,0 +1,310 @@
+"""Read-only JSON API over the indicator cube, next to the dashboard.
+
+    python api.py [--host 127.0.0.1] [--port 8502]
+
+Endpoints (GET, query parameters; ``year`` defaults to the latest year with data):
+
+    /indicators                                     indicators and computed themes with their years
+    /values?indicator=..&year=..[&statcode=..]      value per statcode
+    /ranking?indicator=..&year=..[&order=desc][&limit=n]
+    /breaks?indicator=..&year=..[&scheme=quantile]  class edges as used by the map
+    /geometry[?zoom=6]                              simplified WGS84 boundaries (GeoJSON)
+    /municipality?statcode=..                       latest value of every indicator
+
+Everything is served from memory: the cube, the theme scores and the
+geometry are loaded once and swapped when the data version changes (checked
+at most once per ``CHECK_INTERVAL`` seconds). Every response carries a
+strong ETag derived from the data version and the request, with
+``Cache-Control: no-cache``, so clients and proxies revalidate with
+``If-None-Match`` and get a bodyless 304 while the data is unchanged.
+Encoded bodies are kept in the data cache, gzipped for clients that accept it.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+import classify
+import datacache
+import geojsonwriter
+import geostore
+import indicatorcube
+import themes
+
+CHECK_INTERVAL = 1.0
+DEFAULT_ZOOM = 6
+# Smaller bodies are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Snapshot:
+    """One consistent version of the data behind the API."""
+
+    def __init__(self, cube, scores):
+        boundaries = geostore.load_geometry()
+        self.cube = cube
+        self.scores = scores
+        self.statcodes = boundaries[geostore.KEY].tolist()
+        self.statnamen = boundaries["statnaam"].tolist()
+        self._positions = {statcode: m for m, statcode in enumerate(self.statcodes)}
+        self.version = snapshot_version(cube, scores)
+
+    # Names are resolved like on the dashboard: a computed theme takes precedence over
+    # the cube entry of its registry file
+
+    def years(self, name):
+        if name in self.scores:
+            return self.scores.available_years(name)
+        if name in self.cube:
+            return self.cube.available_years(name)
+        raise ApiError(HTTPStatus.NOT_FOUND, f"unknown indicator: {name}")
+
+    def values(self, name, year):
+        if name in self.scores:
+            return self.scores.values(name, year)
+        return self.cube.values(name, year)
+
+    def position(self, statcode):
+        position = self._positions.get(statcode)
+        if position is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"unknown statcode: {statcode}")
+        return position
+
+
+def snapshot_version(cube, scores):
+    return hashlib.sha1(f"{geostore.geometry_version()}|{cube.version}|{scores.version}".encode()).hexdigest()
+
+
+class Store:
+    """Holds the current snapshot; a new one replaces it when the cube or geometry changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = time.monotonic()
+        self.snapshot = Snapshot(indicatorcube.load_cube(), themes.load_scores())
+
+    def current(self):
+        """Return the current snapshot, checking the sources at most once per ``CHECK_INTERVAL``."""
+        if time.monotonic() - self._checked >= CHECK_INTERVAL:
+            with self._lock:
+                if time.monotonic() - self._checked >= CHECK_INTERVAL:
+                    cube, scores = indicatorcube.load_cube(), themes.load_scores()
+                    if snapshot_version(cube, scores) != self.snapshot.version:
+                        self.snapshot = Snapshot(cube, scores)
+                    self._checked = time.monotonic()
+        return self.snapshot
+
+
+def _number(value):
+    return None if np.isnan(value) else float(value)
+
+
+def _selected(snapshot, query):
+    name = query.get("indicator")
+    if not name:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "missing parameter: indicator")
+    years = snapshot.years(name)
+    year = query.get("year") or (years[-1] if years else None)
+    if year not in years:
+        raise ApiError(HTTPStatus.NOT_FOUND, f"no data for {name} in {year}")
+    return name, year, snapshot.values(name, year)
+
+
+def indicators(snapshot, query):
+    return {
+        "indicators": [
+            {"name": name, "type": "indicator", "years": snapshot.cube.available_years(name)}
+            for name in snapshot.cube.indicators
+            if name not in snapshot.scores
+        ] + [
+            {"name": theme, "type": "theme", "years": snapshot.scores.available_years(theme)}
+            for theme in snapshot.scores.themes
+        ]
+    }
+
+
+def values(snapshot, query):
+    name, year, data = _selected(snapshot, query)
+    if query.get("statcode"):
+        return {"indicator": name, "year": year, "statcode": query["statcode"],
+                "value": _number(data[snapshot.position(query["statcode"])])}
+    return {"indicator": name, "year": year,
+            "values": dict(zip(snapshot.statcodes, (_number(value) for value in data)))}
+
+
+def ranking(snapshot, query):
+    name, year, data = _selected(snapshot, query)
+    order = query.get("order", "desc")
+    if order not in ("asc", "desc"):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "order must be asc or desc")
+    filled = np.flatnonzero(~np.isnan(data))
+    ranked = filled[np.argsort(data[filled], kind="stable")]
+    if order == "desc":
+        ranked = ranked[::-1]
+    try:
+        limit = int(query.get("limit", len(ranked)))
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "limit must be a number") from None
+    if limit < 0:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "limit must not be negative")
+    return {"indicator": name, "year": year, "order": order, "ranking": [
+        {"rank": rank, "statcode": snapshot.statcodes[m], "statnaam": snapshot.statnamen[m], "value": float(data[m])}
+        for rank, m in enumerate(ranked[:limit], start=1)
+    ]}
+
+
+def breaks(snapshot, query):
+    name, year, data = _selected(snapshot, query)
+    scheme = query.get("scheme", "quantile")
+    if scheme not in classify.BREAKS:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"scheme must be one of {', '.join(classify.BREAKS)}")
+    edges, _ = classify.class_colors(data, scheme)
+    return {"indicator": name, "year": year, "scheme": scheme, "edges": [_number(edge) for edge in edges]}
+
+
+def geometry(snapshot, query):
+    try:
+        zoom = float(query.get("zoom", DEFAULT_ZOOM))
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "zoom must be a number") from None
+    # Already JSON, spliced in as is
+    return geojsonwriter.feature_collection(
+        geojsonwriter.encoded_geometry(zoom), statcode=snapshot.statcodes, statnaam=snapshot.statnamen
+    )
+
+
+def municipality(snapshot, query):
+    statcode = query.get("statcode")
+    if not statcode:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "missing parameter: statcode")
+    position = snapshot.position(statcode)
+    return {"statcode": statcode, "statnaam": snapshot.statnamen[position], "indicators": [
+        {"indicator": name, "year": year, "value": value} for name, year, value in snapshot.cube.profile(position)
+    ]}
+
+
+# Path -> (handler, query parameters it reads); other parameters do not change the response
+ROUTES = {
+    "/indicators": (indicators, ()),
+    "/values": (values, ("indicator", "year", "statcode")),
+    "/ranking": (ranking, ("indicator", "year", "order", "limit")),
+    "/breaks": (breaks, ("indicator", "year", "scheme")),
+    "/geometry": (geometry, ("zoom",)),
+    "/municipality": (municipality, ("statcode",)),
+}
+
+
+def _etag_matches(header, etag):
+    if header is None:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "CmonAPI"
+    # Headers and body go out in separate writes; with Nagle on, keep-alive clients wait for delayed ACKs
+    disable_nagle_algorithm = True
+    store = None
+    quiet = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/") or "/"
+        if path not in ROUTES:
+            self._send_error(HTTPStatus.NOT_FOUND, f"unknown endpoint, try one of {', '.join(ROUTES)}")
+            return
+        route, params = ROUTES[path]
+        # The cache key and ETag only cover what the route reads
+        query = {name: value for name, value in parse_qsl(url.query) if name in params}
+        canonical = f"{path}?{sorted(query.items())}"
+        snapshot = self.store.current()
+        version = snapshot.version
+        compress = "gzip" in self.headers.get("Accept-Encoding", "")
+
+        try:
+            body = datacache.cache.get(("api", version, canonical), lambda: self._encode(route, snapshot, query))
+        except ApiError as e:
+            self._send_error(e.status, str(e))
+            return
+        compress = compress and len(body) >= GZIP_MIN_BYTES
+        representation = "gzip" if compress else "identity"
+        etag = '"' + hashlib.sha1(f"{version}|{canonical}|{representation}".encode()).hexdigest()[:32] + '"'
+
+        if _etag_matches(self.headers.get("If-None-Match"), etag):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self._cache_headers(etag)
+            self.end_headers()
+            return
+        if compress:
+            body = datacache.cache.get(("api-gzip", version, canonical), lambda: gzip.compress(body, 6))
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        if compress:
+            self.send_header("Content-Encoding", "gzip")
+        self._cache_headers(etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _encode(self, route, snapshot, query):
+        result = route(snapshot, query)
+        text = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+        return text.encode("utf-8")
+
+    def _cache_headers(self, etag):
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+
+    def _send_error(self, status, message):
+        body = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def serve(host="127.0.0.1", port=8502, quiet=True):
+    Handler.store = Store()
+    Handler.quiet = quiet
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8502, help="port (default: 8502, next to Streamlit's 8501)")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, quiet=not args.verbose)
+    print(f"Serving on http://{args.host}:{args.port} ({', '.join(ROUTES)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,155 @@
+"""Batch export of every indicator x year map as PNG plus a PDF atlas.
+
+    python atlas.py [--out atlas] [--workers N] [--force]
+
+Maps are drawn in a process pool; each worker loads the geometry and the
+indicator cube once. A map is skipped when its PNG exists and its
+fingerprint (geometry version, style, title and the values themselves) is
+unchanged since the last run, as recorded in ``<out>/atlas.json``. The PDF
+atlas has one page per map, built from the PNGs in registry order, and is
+only rewritten when a map changed.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import geostore
+import indicatorcube
+import maprender
+
+MANIFEST = "atlas.json"
+PDF_NAME = "atlas.pdf"
+
+_cube = None
+
+
+def file_name(indicator, year):
+    slug = re.sub(r"[^\w-]+", "_", indicator).strip("_")
+    return f"{slug}_{year}.png"
+
+
+def fingerprint(cube, indicator, year, style=maprender.DEFAULT_STYLE):
+    digest = hashlib.sha1()
+    digest.update(f"{geostore.geometry_version()}|{style}|{maprender.map_title(indicator, year)}".encode())
+    digest.update(cube.values(indicator, year).tobytes())
+    return digest.hexdigest()
+
+
+def atlas_pages(cube):
+    """(indicator, year) of every map with data, in registry and year order."""
+    return [(indicator, year) for indicator in cube.indicators for year in cube.available_years(indicator)]
+
+
+def _init_worker():
+    global _cube
+    # Loaded once per worker process and reused for all of its maps
+    geostore.load_geometry()
+    _cube = indicatorcube.load_cube()
+
+
+def _draw(indicator, year, path):
+    start = time.perf_counter()
+    png = maprender.draw_map(indicator, year, maprender.DEFAULT_STYLE, "png", _cube)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(png)
+    os.replace(tmp, path)
+    return time.perf_counter() - start
+
+
+def write_pdf(paths, pdf_path, style=maprender.DEFAULT_STYLE):
+    import matplotlib.image as mpimg
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+    tmp = f"{pdf_path}.tmp{os.getpid()}"
+    with PdfPages(tmp) as pdf:
+        for path in paths:
+            fig = Figure(figsize=style.figsize, dpi=style.dpi)
+            ax = fig.add_axes([0, 0, 1, 1])
+            ax.imshow(mpimg.imread(path))
+            ax.set_axis_off()
+            pdf.savefig(fig)
+            fig.clear()
+    os.replace(tmp, pdf_path)
+
+
+def build_atlas(out="atlas", workers=None, force=False, log=print):
+    """Render all maps that are missing or out of date and rebuild the PDF.
+
+    A map that fails to render is reported and left out of the manifest, so
+    the next run retries it. Returns the number of maps rendered and a list
+    of the maps that failed.
+    """
+    os.makedirs(out, exist_ok=True)
+    cube = indicatorcube.load_cube()
+    manifest_path = os.path.join(out, MANIFEST)
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    pages = atlas_pages(cube)
+    todo = []
+    fingerprints = {}
+    for indicator, year in pages:
+        name = file_name(indicator, year)
+        fingerprints[name] = fingerprint(cube, indicator, year)
+        if force or manifest.get(name) != fingerprints[name] or not os.path.exists(os.path.join(out, name)):
+            todo.append((indicator, year, os.path.join(out, name)))
+            manifest.pop(name, None)
+    # Maps of indicators or years that are gone
+    manifest = {name: value for name, value in manifest.items() if name in fingerprints}
+    for path in glob.glob(os.path.join(out, "*.png")):
+        if os.path.basename(path) not in fingerprints:
+            os.remove(path)
+    log(f"{len(pages)} maps, {len(pages) - len(todo)} up to date, {len(todo)} to render")
+
+    start = time.perf_counter()
+    failed = []
+    try:
+        if todo:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = {pool.submit(_draw, *job): job for job in todo}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    indicator, year, path = futures[future]
+                    try:
+                        seconds = future.result()
+                    except Exception as e:
+                        failed.append((indicator, year))
+                        log(f"[{done}/{len(todo)}] {indicator} {year} failed: {type(e).__name__}: {e}")
+                        continue
+                    manifest[os.path.basename(path)] = fingerprints[os.path.basename(path)]
+                    log(f"[{done}/{len(todo)}] {indicator} {year} ({seconds:.1f} s)")
+    finally:
+        # Also after an interruption, so finished maps are not drawn again
+        tmp = f"{manifest_path}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, manifest_path)
+
+    pdf_path = os.path.join(out, PDF_NAME)
+    if todo or not os.path.exists(pdf_path):
+        names = [file_name(indicator, year) for indicator, year in pages]
+        write_pdf([os.path.join(out, name) for name in names if name in manifest], pdf_path)
+        log(f"Wrote {pdf_path} ({sum(name in manifest for name in names)} pages)")
+    log(f"Done in {time.perf_counter() - start:.1f} s" + (f", {len(failed)} map(s) failed" if failed else ""))
+    return len(todo) - len(failed), failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default="atlas", help="output directory (default: atlas)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="render every map, also when up to date")
+    args = parser.parse_args()
+    _, failed = build_atlas(args.out, args.workers, args.force, log=lambda line: print(line, flush=True))
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,389 @@
+"""Contiguity graph and spatial autocorrelation (Moran's I, LISA) over the cube.
+
+The queen contiguity graph (municipalities sharing a border or a corner) is
+built once per geometry version from the shared geometry and stored as CSR
+arrays in ``contiguity.npz``, in the statcode order of the cube. Weights are
+row-standardized: the spatial lag of a municipality is the mean over its
+neighbours.
+
+Global Moran's I and local Moran's I (LISA) are computed for every
+indicator and year of the cube, with conditional permutation tests batched
+in NumPy: one set of random draws is shared by all municipalities, each
+skipping itself. Municipalities without a value are left out of every
+statistic, as are their links. The results are stored in ``autocorr.npz``
+per cube version, so the hot-spot map mode is a lookup.
+
+The random draws of a column are seeded from a digest of its values, so a
+column's results do not depend on the other columns. After a data change
+only the columns whose values changed are computed again; ingest.py does
+that after every ingest. The dashboard never computes the whole set: while
+the stored results are missing or out of date it runs LISA for the selected
+column only (``hotspots``), which gives the same clusters.
+
+    python autocorr.py [--permutations 999]
+"""
+import argparse
+import hashlib
+import os
+import time
+
+import numpy as np
+
+import datacache
+import geostore
+import indicatorcube
+
+CONTIGUITY_PATH = "contiguity.npz"
+RESULTS_PATH = "autocorr.npz"
+PERMUTATIONS = 999
+SIGNIFICANCE = 0.05
+SEED = 12345
+
+# Map scheme key and label for the hot-spot mode, next to classify.SCHEMES
+SCHEME = "hotspot"
+SCHEME_LABEL = "Clusters (LISA)"
+
+# LISA cluster codes; -1 is no value or no neighbours
+NOT_SIGNIFICANT, HIGH_HIGH, LOW_HIGH, LOW_LOW, HIGH_LOW = range(5)
+CLUSTERS = {
+    HIGH_HIGH: ("Hoog omringd door hoog", (215, 25, 28)),
+    LOW_LOW: ("Laag omringd door laag", (44, 123, 182)),
+    HIGH_LOW: ("Hoog omringd door laag", (253, 174, 97)),
+    LOW_HIGH: ("Laag omringd door hoog", (171, 217, 233)),
+    NOT_SIGNIFICANT: ("Niet significant", (220, 220, 220)),
+}
+PALETTE = np.array([CLUSTERS[code][1] for code in range(5)], dtype=np.uint8)
+MISSING_COLOR = np.array([255, 255, 255], dtype=np.uint8)
+
+
+class Contiguity:
+    """Queen contiguity as CSR arrays: the neighbours of municipality ``i`` are
+    ``indices[indptr[i]:indptr[i + 1]]``."""
+
+    def __init__(self, statcodes, indptr, indices, version):
+        self.statcodes = statcodes
+        self.indptr = indptr
+        self.indices = indices
+        self.version = version
+        self.cardinality = np.diff(indptr)
+
+    @property
+    def nbytes(self):
+        return self.statcodes.nbytes + self.indptr.nbytes + self.indices.nbytes
+
+    def neighbours(self, position):
+        return self.indices[self.indptr[position]:self.indptr[position + 1]]
+
+    def lag_sum(self, values):
+        """Sum over the neighbours of every municipality, for each column of ``values``."""
+        gathered = np.cumsum(values[self.indices], axis=0)
+        gathered = np.concatenate([np.zeros((1,) + gathered.shape[1:]), gathered])
+        # Difference of prefix sums also handles municipalities without neighbours
+        return gathered[self.indptr[1:]] - gathered[self.indptr[:-1]]
+
+    def save(self, path=CONTIGUITY_PATH):
+        np.savez(path, statcodes=np.asarray(self.statcodes, dtype=str), indptr=self.indptr,
+                 indices=self.indices, version=np.asarray(self.version))
+
+    @classmethod
+    def read(cls, path=CONTIGUITY_PATH):
+        with np.load(path) as npz:
+            return cls(npz["statcodes"], npz["indptr"], npz["indices"], str(npz["version"]))
+
+
+def build_contiguity():
+    """Queen contiguity of the shared geometry, from one batched STRtree query."""
+    import shapely
+
+    boundaries = geostore.load_geometry()
+    geometries = boundaries.geometry.to_numpy()
+    source, target = shapely.STRtree(geometries).query(geometries, predicate="intersects")
+    keep = source != target
+    source, target = source[keep], target[keep]
+    order = np.lexsort((target, source))
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(source, minlength=len(geometries)))])
+    return Contiguity(
+        boundaries[geostore.KEY].to_numpy(dtype=str), indptr, target[order], geostore.geometry_version()
+    )
+
+
+def load_contiguity(path=CONTIGUITY_PATH):
+    """Return the contiguity graph, rebuilding it when the geometry changed."""
+
+    def load():
+        if os.path.exists(path):
+            graph = Contiguity.read(path)
+            if graph.version == geostore.geometry_version():
+                return graph
+        graph = build_contiguity()
+        graph.save(path)
+        return graph
+
+    return datacache.cache.get(("contiguity", path), load, sources=[path, geostore.GEOMETRY_SOURCE])
+
+
+def _lags(values, graph):
+    """Deviations, neighbour counts and spatial lags per column; NaN values are
+    left out, also as neighbours."""
+    present = ~np.isnan(values)
+    count = present.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = values - np.nansum(values, axis=0) / count
+        z0 = np.where(present, z, 0.0)
+        neighbours = graph.lag_sum(present.astype(float))
+        lag = np.where(present & (neighbours > 0), graph.lag_sum(z0) / neighbours, np.nan)
+    return z0, present, neighbours, lag
+
+
+def moran(values, graph):
+    """Global Moran's I per column of ``values`` (municipality, column)."""
+    z0, present, neighbours, lag = _lags(values, graph)
+    linked = present & (neighbours > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (present.sum(axis=0) / linked.sum(axis=0)
+                * np.nansum(np.where(linked, z0 * lag, np.nan), axis=0) / (z0 ** 2).sum(axis=0))
+
+
+def moran_test(values, graph, permutations=PERMUTATIONS, rng=None):
+    """Global Moran's I of one column and its pseudo p-value from ``permutations``
+    random relabellings of the municipalities with a value."""
+    rng = rng if rng is not None else np.random.default_rng(SEED)
+    observed = moran(values[:, None], graph)[0]
+    z0, present, neighbours, _ = _lags(values[:, None], graph)
+    positions = np.flatnonzero(present[:, 0])
+    if np.isnan(observed) or len(positions) < 3:
+        return observed, np.nan
+    # Relabelling keeps the set of values, so only the lag sums change
+    linked = present[:, 0] & (neighbours[:, 0] > 0)
+    shuffled = np.zeros((len(values), permutations))
+    shuffled[positions] = z0[positions, 0][np.argsort(rng.random((len(positions), permutations)), axis=0)]
+    lag_sums = graph.lag_sum(shuffled)[linked] / neighbours[linked]
+    simulated = (len(positions) / linked.sum() * (shuffled[linked] * lag_sums).sum(axis=0)
+                 / (z0 ** 2).sum())
+    larger = np.count_nonzero(np.abs(simulated) >= abs(observed))
+    return observed, (larger + 1) / (permutations + 1)
+
+
+def lisa(values, graph, permutations=PERMUTATIONS, rng=None):
+    """Local Moran's I of one column with conditional permutation p-values and
+    cluster codes.
+
+    Every municipality keeps its own value while ``k`` (its number of
+    neighbours with a value) random other municipalities stand in for its
+    neighbours. The draws are shared: one ``(permutations, max k)`` table of
+    positions, where a municipality skips itself by shifting the draws at or
+    above its own position up by one.
+    """
+    rng = rng if rng is not None else np.random.default_rng(SEED)
+    n = len(values)
+    local = np.full(n, np.nan)
+    p_values = np.full(n, np.nan)
+    clusters = np.full(n, -1, dtype=np.int8)
+
+    z0, present, neighbours, lag = _lags(values[:, None], graph)
+    z0, present, neighbours, lag = z0[:, 0], present[:, 0], neighbours[:, 0].astype(int), lag[:, 0]
+    positions = np.flatnonzero(present & (neighbours > 0))
+    m2 = (z0 ** 2).sum() / present.sum() if present.any() else 0.0
+    if len(positions) == 0 or m2 == 0:
+        return local, p_values, clusters
+    local[positions] = z0[positions] * lag[positions] / m2
+
+    # Draw from the municipalities with a value; own rank among them to skip itself
+    candidates = np.flatnonzero(present)
+    own = np.searchsorted(candidates, positions)
+    k = neighbours[positions]
+    size = min(int(k.max()), len(candidates) - 1)
+    draws = np.argsort(rng.random((permutations, len(candidates) - 1)), axis=1)[:, :size]
+    drawable = z0[candidates]
+    simulated = np.zeros((len(positions), permutations))
+    for slot in range(size):
+        rows = np.flatnonzero(k > slot)
+        drawn = draws[:, slot]
+        simulated[rows] += drawable[drawn + (drawn >= own[rows, None])]
+    simulated /= k[:, None]
+
+    # Folded pseudo p-value: the share of draws at least as extreme on the observed side
+    larger = np.count_nonzero(simulated * z0[positions, None] >= (lag * z0)[positions, None], axis=1)
+    larger = np.minimum(larger, permutations - larger)
+    p_values[positions] = (larger + 1) / (permutations + 1)
+
+    high, high_lag = z0[positions] > 0, lag[positions] > 0
+    codes = np.select(
+        [high & high_lag, ~high & high_lag, ~high & ~high_lag], [HIGH_HIGH, LOW_HIGH, LOW_LOW], HIGH_LOW
+    )
+    clusters[positions] = np.where(p_values[positions] <= SIGNIFICANCE, codes, NOT_SIGNIFICANT)
+    return local, p_values, clusters
+
+
+def cluster_colors(clusters):
+    """(n, 3) uint8 RGB per cluster code, white without a value or neighbours."""
+    colors = PALETTE[np.clip(clusters, 0, len(PALETTE) - 1)]
+    colors[clusters < 0] = MISSING_COLOR
+    return colors
+
+
+class Autocorrelation(indicatorcube.YearSlices):
+    """Moran's I per (indicator, year) and LISA per (municipality, indicator, year)
+    of a cube."""
+
+    def __init__(self, version, indicators, years, moran_i, moran_p, local_p, clusters, digests):
+        self.version = version
+        self.indicators = list(indicators)
+        self.years = list(years)
+        self.moran_i = moran_i
+        self.moran_p = moran_p
+        self.local_p = local_p
+        self.clusters = clusters
+        # Per (indicator, year) the key of the column's results, empty without values
+        self.digests = digests
+        self._index(self.indicators, self.years)
+
+    @property
+    def nbytes(self):
+        return self.moran_i.nbytes + self.moran_p.nbytes + self.local_p.nbytes + self.clusters.nbytes
+
+    def global_moran(self, indicator, year):
+        """(Moran's I, p-value), NaN when the indicator has no values that year."""
+        i, j = self._position(indicator, year)
+        if i is None or j is None:
+            return np.nan, np.nan
+        return float(self.moran_i[i, j]), float(self.moran_p[i, j])
+
+    def cluster_codes(self, indicator, year):
+        i, j = self._position(indicator, year)
+        if i is None or j is None:
+            return None
+        return self.clusters[:, i, j]
+
+    def save(self, path=RESULTS_PATH):
+        np.savez(
+            path, version=np.asarray(self.version), indicators=np.asarray(self.indicators, dtype=str),
+            years=np.asarray(self.years, dtype=str), moran_i=self.moran_i, moran_p=self.moran_p,
+            local_p=self.local_p, clusters=self.clusters, digests=np.asarray(self.digests, dtype=str),
+        )
+
+    @classmethod
+    def read(cls, path=RESULTS_PATH):
+        with np.load(path) as npz:
+            # Files written before the digests were stored have nothing to reuse
+            digests = npz["digests"] if "digests" in npz else np.full(npz["moran_i"].shape, "")
+            return cls(
+                str(npz["version"]), npz["indicators"].tolist(), npz["years"].tolist(), npz["moran_i"],
+                npz["moran_p"], npz["local_p"], npz["clusters"], digests,
+            )
+
+
+def _version(cube, graph, permutations):
+    return hashlib.sha1(f"{cube.version}|{graph.version}|{permutations}|{SEED}".encode()).hexdigest()
+
+
+def _digest(values, graph, permutations):
+    """Key of the results of one column: its values, the graph and the test settings."""
+    return hashlib.sha1(values.tobytes() + f"|{graph.version}|{permutations}|{SEED}".encode()).hexdigest()
+
+
+def _column_rng(digest, stream):
+    return np.random.default_rng([SEED, int(digest[:16], 16), stream])
+
+
+def compute(cube, graph, permutations=PERMUTATIONS, previous=None):
+    """Moran's I and LISA for every indicator and year of the cube.
+
+    Columns with the same values as a column of ``previous`` are copied from
+    it. Returns the results and the number of columns computed.
+    """
+    m, n_indicators, n_years = cube.data.shape
+    moran_i = np.full((n_indicators, n_years), np.nan)
+    moran_p = np.full((n_indicators, n_years), np.nan)
+    local_p = np.full((m, n_indicators, n_years), np.nan, dtype=np.float32)
+    clusters = np.full((m, n_indicators, n_years), -1, dtype=np.int8)
+    digests = np.full((n_indicators, n_years), "", dtype=object)
+    reusable = {}
+    if previous is not None and len(previous.clusters) == m:
+        reusable = {digest: (i, j) for (i, j), digest in np.ndenumerate(previous.digests) if digest}
+    computed = 0
+    for i in range(n_indicators):
+        for j in range(n_years):
+            values = cube.data[:, i, j]
+            if np.isnan(values).all():
+                continue
+            digest = digests[i, j] = _digest(values, graph, permutations)
+            if digest in reusable:
+                pi, pj = reusable[digest]
+                moran_i[i, j], moran_p[i, j] = previous.moran_i[pi, pj], previous.moran_p[pi, pj]
+                local_p[:, i, j], clusters[:, i, j] = previous.local_p[:, pi, pj], previous.clusters[:, pi, pj]
+                continue
+            moran_i[i, j], moran_p[i, j] = moran_test(values, graph, permutations, _column_rng(digest, 0))
+            _, local_p[:, i, j], clusters[:, i, j] = lisa(values, graph, permutations, _column_rng(digest, 1))
+            computed += 1
+    results = Autocorrelation(
+        _version(cube, graph, permutations), cube.indicators, cube.years, moran_i, moran_p, local_p, clusters,
+        digests.astype(str),
+    )
+    return results, computed
+
+
+def update(path=RESULTS_PATH, permutations=PERMUTATIONS):
+    """Bring the stored results up to date with the cube, computing only changed columns.
+
+    Returns the results and the number of columns computed.
+    """
+    cube = indicatorcube.load_cube()
+    graph = load_contiguity()
+    previous = Autocorrelation.read(path) if os.path.exists(path) else None
+    if previous is not None and previous.version == _version(cube, graph, permutations):
+        return previous, 0
+    results, computed = compute(cube, graph, permutations, previous)
+    results.save(path)
+    return results, computed
+
+
+def load_results(path=RESULTS_PATH, permutations=PERMUTATIONS):
+    """Return the stored results of the current cube, None while they are missing
+    or out of date (see ``update``)."""
+    cube = indicatorcube.load_cube()
+    graph = load_contiguity()
+    version = _version(cube, graph, permutations)
+
+    def load():
+        if os.path.exists(path):
+            results = Autocorrelation.read(path)
+            if results.version == version:
+                return results
+        return None
+
+    return datacache.cache.get(("autocorr", path, version), load, sources=[path])
+
+
+def hotspots(values, permutations=PERMUTATIONS):
+    """LISA cluster codes of any values in the cube's statcode order (theme scores,
+    reweighted themes, cube columns without stored results), cached by the values."""
+    graph = load_contiguity()
+    values = np.asarray(values, dtype=float)
+    digest = _digest(values, graph, permutations)
+    return datacache.cache.get(
+        ("hotspots", digest), lambda: lisa(values, graph, permutations, _column_rng(digest, 1))[2]
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--permutations", type=int, default=PERMUTATIONS,
+                        help=f"random permutations per test (default: {PERMUTATIONS})")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    graph = build_contiguity()
+    graph.save()
+    islands = graph.statcodes[graph.cardinality == 0]
+    print(f"Wrote {CONTIGUITY_PATH}: {len(graph.statcodes)} municipalities, {len(graph.indices) // 2} borders, "
+          f"{len(islands)} without neighbours {islands.tolist()} in {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    cube = indicatorcube.load_cube()
+    results, computed = update(permutations=args.permutations)
+    print(f"Wrote {RESULTS_PATH}, {computed} column(s) computed in {time.perf_counter() - start:.1f} s")
+    latest = {name: cube.available_years(name)[-1] for name in cube.indicators if cube.available_years(name)}
+    for name, year in latest.items():
+        i, p = results.global_moran(name, year)
+        print(f"  {name} ({year}): Moran's I {i:.3f}, p {p:.3f}")
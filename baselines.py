@@ -0,0 +1,50 @@
+"""Stored baselines of the performance harnesses, benchmark.py and loadtest.py.
+
+Both write their results as JSON and compare a run with the stored baseline
+through their own ``compare(baseline, current, threshold)``, which returns
+the regressions as lines of text. A run with regressions exits with status 1.
+"""
+import json
+import os
+import sys
+
+
+def add_arguments(parser, path, threshold, growth="growth"):
+    """The --baseline, --save, --threshold and --output options."""
+    parser.add_argument("--baseline", default=path, help=f"baseline file (default: {path})")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=threshold,
+                        help=f"allowed relative {growth} (default: {threshold})")
+    parser.add_argument("--output", help="also write the results to this file")
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save(results, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=1, ensure_ascii=False)
+
+
+def check(args, current, compare):
+    """Write, store or compare ``current`` as the options of ``add_arguments`` ask.
+
+    Exits with status 1 when ``compare`` finds regressions against the baseline.
+    """
+    if args.output:
+        save(current, args.output)
+    if args.save:
+        save(current, args.baseline)
+        print(f"\nSaved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        regressions = compare(load(args.baseline), current, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+    else:
+        print(f"\nNo baseline at {args.baseline}; run with --save to create one")
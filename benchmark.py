@@ -0,0 +1,212 @@
+"""Benchmarks of the dashboard's data and render stages per registry entry.
+
+    python benchmark.py                 # run and compare with the baseline
+    python benchmark.py --save          # run and store the results as the new baseline
+    python benchmark.py --only "Natuur" --repeat 5
+
+For every entry of the registry (latest year with data) the stages below run
+in order, each on the output of the previous one:
+
+    load      read the indicator GeoJSON
+    coerce    numeric values with NaN for missing, in geometry order
+    classify  quantile classes and colors
+    to_crs    reproject the boundaries to WGS84
+    serialize the GeoJSON payload of the pydeck map
+    pydeck    the serialized pydeck spec
+    render    the matplotlib PNG of the map download page
+
+Wall time is the median of ``--repeat`` runs. Peak memory is measured in a
+separate run under tracemalloc, so it covers Python and NumPy allocations
+but not GDAL's. A stage regresses when its time, peak memory or payload size
+grows by more than ``--threshold`` over the baseline and by more than a small
+absolute slack; the run then exits with status 1.
+"""
+import argparse
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+
+import baselines
+import classify
+import geojsonwriter
+import geostore
+import indicatorcube
+import maprender
+from registry import file_options
+
+BASELINE_PATH = "benchmark_baseline.json"
+DEFAULT_THRESHOLD = 0.25
+MAP_ZOOM = 6
+
+# Differences below these are noise, whatever the relative change
+MIN_DELTA = {"time_s": 0.005, "peak_bytes": 256 * 1024, "payload_bytes": 0}
+
+
+def _load(ctx):
+    import geopandas as gpd
+
+    ctx["frame"] = gpd.read_file(ctx["path"])
+
+
+def _coerce(ctx):
+    import pandas as pd
+
+    frame = ctx["frame"].dropna(subset=[geostore.KEY]).set_index(geostore.KEY)
+    statcodes = geostore.load_geometry()[geostore.KEY]
+    ctx["values"] = pd.to_numeric(frame[ctx["column"]], errors="coerce").reindex(statcodes).to_numpy(dtype=float)
+
+
+def _classify(ctx):
+    _, ctx["colors"] = classify.class_colors(ctx["values"], scheme="quantile")
+
+
+def _to_crs(ctx):
+    ctx["wgs84"] = ctx["frame"].to_crs(geostore.WEB_CRS)
+
+
+def _serialize(ctx):
+    boundaries = geostore.load_geometry()
+    hover_info = boundaries["statnaam"] + ": " + ctx["values"].astype(str)
+    ctx["geojson"] = geojsonwriter.feature_collection(
+        geojsonwriter.encoded_geometry(zoom=MAP_ZOOM),
+        statcode=boundaries["statcode"].to_numpy(),
+        hover_info=hover_info.to_numpy(),
+        fill_color=ctx["colors"],
+    )
+    return len(ctx["geojson"].encode())
+
+
+def _pydeck(ctx):
+    import pydeck as pdk
+
+    center = geostore.load_geometry_wgs84().center
+    layer = pdk.Layer("GeoJsonLayer", data="municipalities", get_fill_color="properties.fill_color", pickable=True)
+    deck = geojsonwriter.RawDataDeck(
+        layers=[layer],
+        initial_view_state=pdk.ViewState(latitude=center[0], longitude=center[1], zoom=MAP_ZOOM),
+        tooltip={"html": "<b>{hover_info}</b>"},
+        raw_data={"municipalities": ctx["geojson"]},
+    )
+    return len(deck.to_json().encode())
+
+
+def _render(ctx):
+    png = maprender.draw_map(ctx["name"], ctx["year"], maprender.DEFAULT_STYLE, "png", ctx["cube"])
+    return len(png)
+
+
+STAGES = [
+    ("load", _load),
+    ("coerce", _coerce),
+    ("classify", _classify),
+    ("to_crs", _to_crs),
+    ("serialize", _serialize),
+    ("pydeck", _pydeck),
+    ("render", _render),
+]
+
+
+def _measure(stage, ctx, repeat):
+    times = []
+    payload = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = stage(ctx)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        stage(ctx)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result = {"time_s": statistics.median(times), "peak_bytes": peak}
+    if payload is not None:
+        result["payload_bytes"] = payload
+    return result
+
+
+def bench_entry(name, info, cube, repeat=3):
+    """Run every stage for one registry entry; returns {stage: measurements} or a skip reason."""
+    if not os.path.exists(info["path"]):
+        return f"file not found: {info['path']}"
+    years = [year for year in info["year_columns"] if year in cube.available_years(name)]
+    if not years:
+        return "no year with data"
+    ctx = {"name": name, "path": info["path"], "cube": cube, "year": years[-1]}
+    ctx["column"] = info["year_columns"][ctx["year"]]
+    return {stage_name: _measure(stage, ctx, repeat) for stage_name, stage in STAGES}
+
+
+def run(names=None, repeat=3, log=print):
+    cube = indicatorcube.load_cube()
+    # Shared geometry and encoded boundaries are cached by the dashboard, warm them first
+    geojsonwriter.encoded_geometry(zoom=MAP_ZOOM)
+    geostore.load_geometry_wgs84()
+
+    results = {}
+    for name, info in indicatorcube.registry_entries():
+        if info is None or (names and name not in names):
+            continue
+        outcome = bench_entry(name, info, cube, repeat)
+        if isinstance(outcome, str):
+            log(f"{name}: skipped ({outcome})")
+            continue
+        results[name] = outcome
+        total = sum(stage["time_s"] for stage in outcome.values())
+        log(f"{name}: {total * 1000:.0f} ms")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "repeat": repeat,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Return a list of regressions of ``current`` against ``baseline``."""
+    regressions = []
+    for name, stages in current["results"].items():
+        for stage_name, measured in stages.items():
+            base = baseline["results"].get(name, {}).get(stage_name)
+            if base is None:
+                continue
+            for metric, value in measured.items():
+                old = base.get(metric)
+                if old is None:
+                    continue
+                if value > old * (1 + threshold) and value - old > MIN_DELTA[metric]:
+                    regressions.append(f"{name} / {stage_name}: {metric} {old:.4g} -> {value:.4g}")
+    return regressions
+
+
+def summary(current):
+    """Per-stage totals over all entries."""
+    totals = {}
+    for stages in current["results"].values():
+        for stage_name, measured in stages.items():
+            total = totals.setdefault(stage_name, {"time_s": 0.0, "peak_bytes": 0})
+            total["time_s"] += measured["time_s"]
+            total["peak_bytes"] = max(total["peak_bytes"], measured["peak_bytes"])
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=sorted(file_options), metavar="NAME",
+                        help="registry entries to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (default: 3)")
+    baselines.add_arguments(parser, BASELINE_PATH, DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    current = run(args.only, args.repeat, log=lambda line: print(line, flush=True))
+    print(f"\n{'stage':<10} {'total ms':>10} {'max peak MiB':>13}")
+    for stage_name, total in summary(current).items():
+        print(f"{stage_name:<10} {total['time_s'] * 1000:>10.1f} {total['peak_bytes'] / 2**20:>13.1f}")
+
+    baselines.check(args, current, compare)
@@ -0,0 +1,118 @@
+"""Vectorized map classification and coloring.
+
+Breaks are returned as class edges ``[min, b1, ..., max]``; a value falls in
+class ``i`` when it is ``<= edges[i + 1]`` (and above the previous edge), so the
+quantile scheme colors exactly like the old per-row ``get_color``.
+"""
+import functools
+
+import numpy as np
+
+# Red, orange, yellow, green from the lowest to the highest class
+PALETTE = np.array([[255, 0, 0], [255, 165, 0], [255, 255, 0], [0, 255, 0]], dtype=np.uint8)
+MISSING_COLOR = np.array([255, 255, 255], dtype=np.uint8)
+
+SCHEMES = {
+    "quantile": "Kwantielen",
+    "equal_interval": "Gelijke intervallen",
+    "jenks": "Natuurlijke grenzen (Jenks)",
+}
+
+
+def quantile_breaks(values, k=4):
+    values = np.asarray(values, dtype=float)
+    if np.isnan(values).all():
+        return np.full(k + 1, np.nan)
+    return np.nanquantile(values, np.linspace(0, 1, k + 1))
+
+
+def equal_interval_breaks(values, k=4):
+    values = np.asarray(values, dtype=float)
+    if np.isnan(values).all():
+        return np.full(k + 1, np.nan)
+    return np.linspace(np.nanmin(values), np.nanmax(values), k + 1)
+
+
+# Jenks runs on at most this many evenly spaced order statistics of the values
+JENKS_SAMPLE = 1000
+# Rows of the cost matrix filled per numpy step
+_JENKS_BLOCK = 256
+
+
+def jenks_breaks(values, k=4):
+    """Fisher-Jenks optimal breaks, minimizing the within-class sum of squares.
+
+    Above ``JENKS_SAMPLE`` values the breaks are those of an evenly spaced
+    sample of the sorted values, which keeps the cost flat for fine-grained
+    maps. Breaks are cached per distinct set of values.
+    """
+    x = np.sort(np.asarray(values, dtype=float))
+    x = x[~np.isnan(x)]
+    if len(x) == 0:
+        return np.full(k + 1, np.nan)
+    if len(x) > JENKS_SAMPLE:
+        x = x[np.linspace(0, len(x) - 1, JENKS_SAMPLE).round().astype(np.int64)]
+    return np.array(_jenks_sorted(x.tobytes(), min(k, len(x))))
+
+
+@functools.lru_cache(maxsize=128)
+def _jenks_sorted(data, k):
+    x = np.frombuffer(data)
+    n = len(x)
+    s1 = np.concatenate(([0.0], np.cumsum(x)))
+    s2 = np.concatenate(([0.0], np.cumsum(x * x)))
+
+    # cost[j - 1] is the best cost of splitting x[:j] into the current number of classes
+    ends = np.arange(1, n + 1)
+    cost = s2[ends] - s1[ends] ** 2 / ends
+    starts = np.zeros((k, n + 1), dtype=np.int64)
+    i = np.arange(1, n + 1)
+    for c in range(1, k):
+        new_cost = np.full(n + 1, np.inf)
+        for first in range(c + 1, n + 1, _JENKS_BLOCK):
+            # last class is x[i:j] for every start i, infeasible starts masked out
+            j = np.arange(first, min(first + _JENKS_BLOCK, n + 1))[:, None]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                ssd = s2[j] - s2[i] - (s1[j] - s1[i]) ** 2 / (j - i)
+            total = np.where((i >= c) & (i < j), cost[i - 1] + ssd, np.inf)
+            best = np.argmin(total, axis=1)
+            new_cost[j[:, 0]] = total[np.arange(len(j)), best]
+            starts[c, j[:, 0]] = i[best]
+        cost = new_cost[1:]
+
+    edges = [x[-1]]
+    j = n
+    for c in range(k - 1, 0, -1):
+        j = starts[c, j]
+        edges.append(x[j - 1])
+    edges.append(x[0])
+    return tuple(edges[::-1])
+
+
+BREAKS = {
+    "quantile": quantile_breaks,
+    "equal_interval": equal_interval_breaks,
+    "jenks": jenks_breaks,
+}
+
+
+def classify(values, edges):
+    """Return the class index per value, -1 for missing values."""
+    values = np.asarray(values, dtype=float)
+    classes = np.searchsorted(np.asarray(edges[1:-1], dtype=float), values, side="left")
+    classes[np.isnan(values)] = -1
+    return classes
+
+
+def class_colors(values, scheme="quantile", edges=None, palette=PALETTE):
+    """Color every value in one pass.
+
+    ``edges`` overrides the scheme with user-defined class edges. Returns the
+    edges used and an ``(n, 3)`` uint8 RGB array, white for missing values.
+    """
+    if edges is None:
+        edges = BREAKS[scheme](values, len(palette))
+    classes = classify(values, edges)
+    colors = palette[np.clip(classes, 0, len(palette) - 1)]
+    colors[classes < 0] = MISSING_COLOR
+    return np.asarray(edges), colors
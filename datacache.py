@@ -0,0 +1,166 @@
+"""Process-wide data cache shared by all Streamlit sessions.
+
+Entries have explicit keys and are tied to the source files they were loaded
+from. An entry is reloaded when one of those files changes (size and mtime,
+or a content hash with ``validate="hash"``). The cache keeps to a memory
+budget and evicts the least recently used entries first.
+
+    df = datacache.read_csv("indmaarmunn.csv")
+    datacache.cache.stats()   # hits, misses, evictions, entries, bytes
+"""
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+
+DEFAULT_BUDGET_MB = 512
+
+_MISSING = object()
+
+_hashes = {}  # path -> ((size, mtime), sha1)
+
+
+def file_token(path, validate="mtime"):
+    """Change marker of a source file, None when it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    marker = (stat.st_size, stat.st_mtime_ns)
+    if validate == "hash":
+        # Only rehashed when size or mtime changes, like geostore.source_hash
+        cached = _hashes.get(path)
+        if cached is None or cached[0] != marker:
+            with open(path, "rb") as f:
+                cached = (marker, hashlib.sha1(f.read()).hexdigest())
+            _hashes[path] = cached
+        return cached[1]
+    return marker
+
+
+def estimate_size(value):
+    """Rough memory footprint of a cached value in bytes."""
+    if hasattr(value, "memory_usage"):
+        # pandas DataFrame (usage per column) or Series
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+    if hasattr(value, "nbytes"):
+        # NumPy arrays and objects that report their own footprint
+        return int(value.nbytes)
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class DataCache:
+    """Thread-safe LRU cache with a memory budget and file-based invalidation."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (tokens, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}  # key -> [lock, number of waiting loads]
+
+    def get(self, key, loader, sources=(), validate="mtime", size=None):
+        """Return the cached value for ``key``, calling ``loader()`` on a miss.
+
+        ``sources`` are the files the value depends on; the entry is reloaded
+        when any of them changes. ``size`` overrides the estimated footprint.
+        """
+        tokens = tuple(file_token(path, validate) for path in sources)
+        value = self._lookup(key, tokens)
+        if value is not _MISSING:
+            return value
+
+        # One loader per key, so concurrent sessions do not all read the same file
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+        try:
+            with key_lock[0]:
+                value = self._lookup(key, tokens, count=False)
+                if value is not _MISSING:
+                    return value
+                value = loader()
+                self._store(key, tokens, value, estimate_size(value) if size is None else size)
+                return value
+        finally:
+            # Drop the key's lock once no load is waiting on it
+            with self._lock:
+                key_lock[1] -= 1
+                if not key_lock[1]:
+                    del self._key_locks[key]
+
+    def _lookup(self, key, tokens, count=True):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == tokens:
+                self._entries.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return entry[1]
+            if count:
+                self.misses += 1
+            return _MISSING
+
+    def _store(self, key, tokens, value, size):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if size > self.max_bytes:
+                # Too large to keep, the caller still gets the value
+                return
+            self._entries[key] = (tokens, value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when ``key`` is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._bytes -= old[2]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+cache = DataCache(int(os.environ.get("CMON_CACHE_MB", DEFAULT_BUDGET_MB)) * 1024 * 1024)
+
+
+def read_csv(path, **kwargs):
+    import pandas as pd
+
+    key = ("read_csv", path, tuple(sorted(kwargs.items())))
+    return cache.get(key, lambda: pd.read_csv(path, **kwargs), sources=[path])
+
+
+def read_excel(path, **kwargs):
+    import pandas as pd
+
+    key = ("read_excel", path, tuple(sorted(kwargs.items())))
+    return cache.get(key, lambda: pd.read_excel(path, **kwargs), sources=[path])
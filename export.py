@@ -0,0 +1,253 @@
+"""Bulk export of indicator values as CSV, Parquet or GeoPackage.
+
+The values come from the indicator cube and the shared geometry, so no
+source file is read again. A selection is filtered on indicators, years,
+municipalities (statcode or name) and provinces (with ``gebieden.csv``,
+see rollups.py) and written in chunks of municipalities, so memory use
+does not grow with the size of the selection.
+
+Layouts: ``long`` has one row per municipality, indicator and year with a
+value; ``wide`` has one row per municipality and a column per indicator and
+year. GeoPackage exports are wide by default, with the boundaries in RD New.
+
+    python export.py noorden.csv --province Groningen Friesland Drenthe
+    python export.py werk.parquet --indicator Werkloosheid --year 2021 2022
+    python export.py alles.gpkg [--no-geometry]
+"""
+import argparse
+import glob
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import geostore
+import indicatorcube
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "gpkg": ".gpkg"}
+LAYOUTS = ("long", "wide")
+CHUNK = 50  # municipalities per chunk
+GPKG_LAYER = "indicatoren"
+# Exports made for the dashboard, kept on disk until they are an hour old
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "cmon-exports")
+EXPORT_KEEP_SECONDS = 3600
+
+
+class Selection:
+    """Positions of the selected municipalities, indicators and years in the cube."""
+
+    def __init__(self, cube, indicators=None, years=None, municipalities=None, provinces=None):
+        boundaries = geostore.load_geometry()
+        self.cube = cube
+        self.indicators = _positions(cube.indicators, indicators, "indicator")
+        self.years = _positions(cube.years, [str(year) for year in years] if years else None, "year")
+
+        keep = np.ones(len(boundaries), dtype=bool)
+        if municipalities:
+            wanted = set(municipalities)
+            keep &= boundaries[geostore.KEY].isin(wanted).to_numpy() | boundaries["statnaam"].isin(wanted).to_numpy()
+            found = set(boundaries[geostore.KEY][keep]) | set(boundaries["statnaam"][keep])
+            if wanted - found:
+                raise ValueError(f"Unknown municipality(ies): {', '.join(sorted(wanted - found))}")
+        if provinces:
+            import rollups
+
+            if not rollups.available():
+                raise FileNotFoundError(f"Filtering on province needs {rollups.REGIONS_PATH}, see rollups.py")
+            province = rollups.load_regions()["provincie"]
+            unknown = set(provinces) - set(province)
+            if unknown:
+                raise ValueError(f"Unknown province(s): {', '.join(sorted(unknown))}")
+            keep &= province.isin(provinces).to_numpy()
+        self.municipalities = np.flatnonzero(keep)
+
+    @property
+    def size(self):
+        """Number of (municipality, indicator, year) cells in the selection."""
+        return len(self.municipalities) * len(self.indicators) * len(self.years)
+
+
+def _positions(names, wanted, kind):
+    if not wanted:
+        return np.arange(len(names))
+    missing = [name for name in wanted if name not in names]
+    if missing:
+        raise ValueError(f"Unknown {kind}(s): {', '.join(missing)}")
+    return np.array([names.index(name) for name in wanted])
+
+
+def iter_chunks(selection, layout="long", geometry=False, chunk=CHUNK):
+    """Yield the selection as DataFrames of at most ``chunk`` municipalities each."""
+    import geopandas as gpd
+    import pandas as pd
+
+    boundaries = geostore.load_geometry()
+    cube = selection.cube
+    indicators = np.asarray(cube.indicators, dtype=object)[selection.indicators]
+    years = np.asarray(cube.years, dtype=object)[selection.years]
+    # An empty selection still gives one (empty) chunk, so every file gets its columns
+    for start in range(0, max(len(selection.municipalities), 1), chunk):
+        rows = selection.municipalities[start:start + chunk]
+        values = cube.data[np.ix_(rows, selection.indicators, selection.years)]
+        if layout == "wide":
+            frame = pd.DataFrame(
+                values.reshape(len(rows), len(indicators) * len(years)),
+                columns=[f"{name} {year}" for name in indicators for year in years],
+            )
+            frame.insert(0, "statnaam", boundaries["statnaam"].to_numpy()[rows])
+            frame.insert(0, geostore.KEY, boundaries[geostore.KEY].to_numpy()[rows])
+            row_geometry = boundaries.geometry.to_numpy()[rows]
+        else:
+            m, i, y = np.nonzero(~np.isnan(values))
+            frame = pd.DataFrame({
+                geostore.KEY: boundaries[geostore.KEY].to_numpy()[rows][m],
+                "statnaam": boundaries["statnaam"].to_numpy()[rows][m],
+                "indicator": indicators[i],
+                "jaar": years[y].astype(int),
+                "waarde": values[m, i, y],
+            })
+            row_geometry = boundaries.geometry.to_numpy()[rows][m]
+        if geometry:
+            frame = gpd.GeoDataFrame(frame, geometry=row_geometry, crs=boundaries.crs)
+        yield frame
+
+
+def _write_csv(chunks, path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for n, frame in enumerate(chunks):
+            if "geometry" in frame:
+                frame = frame.to_wkt()
+            frame.to_csv(f, header=n == 0, index=False)
+
+
+def _arrow_schema(columns):
+    """Column types by name; inferring them from a chunk gives null types when it has no values."""
+    import pyarrow as pa
+
+    types = {
+        geostore.KEY: pa.string(), "statnaam": pa.string(), "indicator": pa.string(),
+        "jaar": pa.int64(), "waarde": pa.float64(), "geometry": pa.binary(),
+    }
+    # The remaining columns are the "<indicator> <year>" values of the wide layout
+    return pa.schema([(column, types.get(column, pa.float64())) for column in columns])
+
+
+def _write_parquet(chunks, path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow: pip install pyarrow") from None
+
+    writer = None
+    schema = None
+    try:
+        for frame in chunks:
+            if "geometry" in frame:
+                frame = frame.to_wkb()
+            if schema is None:
+                schema = _arrow_schema(frame.columns)
+            table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, schema)
+            # One row group per chunk
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _write_gpkg(chunks, path):
+    for n, frame in enumerate(chunks):
+        frame.to_file(path, layer=GPKG_LAYER, driver="GPKG", mode="a" if n else "w")
+
+
+WRITERS = {"csv": _write_csv, "parquet": _write_parquet, "gpkg": _write_gpkg}
+
+
+def format_for(path):
+    """Export format from the file extension."""
+    suffix = os.path.splitext(path)[1].lower()
+    for fmt, extension in FORMATS.items():
+        if suffix == extension:
+            return fmt
+    raise ValueError(f"Unknown export format {suffix!r}, expected one of {', '.join(FORMATS.values())}")
+
+
+def export(path, selection, fmt=None, layout=None, geometry=None, chunk=CHUNK):
+    """Write the selection to ``path``; returns the number of chunks written.
+
+    ``layout`` and ``geometry`` default to wide with geometry for GeoPackage
+    and long without geometry otherwise.
+    """
+    fmt = fmt or format_for(path)
+    layout = layout or ("wide" if fmt == "gpkg" else "long")
+    geometry = fmt == "gpkg" if geometry is None else geometry
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout {layout!r}, expected one of {', '.join(LAYOUTS)}")
+    chunks = 0
+
+    def counted():
+        nonlocal chunks
+        for frame in iter_chunks(selection, layout, geometry, chunk):
+            chunks += 1
+            yield frame
+
+    tmp = f"{path}.tmp{os.getpid()}{FORMATS[fmt]}"
+    try:
+        WRITERS[fmt](counted(), tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return chunks
+
+
+def export_file(selection, fmt, **kwargs):
+    """Export to a new file under ``EXPORT_DIR`` and return its path.
+
+    Exports older than ``EXPORT_KEEP_SECONDS`` are removed first.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    cutoff = time.time() - EXPORT_KEEP_SECONDS
+    for old in glob.glob(os.path.join(EXPORT_DIR, "*")):
+        try:
+            if os.path.getmtime(old) < cutoff:
+                os.remove(old)
+        except FileNotFoundError:
+            # Removed by another session
+            pass
+    fd, path = tempfile.mkstemp(suffix=FORMATS[fmt], dir=EXPORT_DIR)
+    os.close(fd)
+    try:
+        export(path, selection, fmt, **kwargs)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="output file, .csv, .parquet or .gpkg")
+    parser.add_argument("--indicator", nargs="+", help="indicator names (default: all)")
+    parser.add_argument("--year", nargs="+", help="years (default: all)")
+    parser.add_argument("--municipality", nargs="+", help="statcodes or municipality names (default: all)")
+    parser.add_argument("--province", nargs="+", help="province names, needs gebieden.csv (default: all)")
+    parser.add_argument("--layout", choices=LAYOUTS, help="long or wide (default: wide for .gpkg, else long)")
+    geometry = parser.add_mutually_exclusive_group()
+    geometry.add_argument("--geometry", action="store_true", default=None, help="include the boundaries")
+    geometry.add_argument("--no-geometry", dest="geometry", action="store_false", help="leave out the boundaries")
+    parser.add_argument("--chunk", type=int, default=CHUNK, help=f"municipalities per chunk (default: {CHUNK})")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        fmt = format_for(args.path)
+        selection = Selection(indicatorcube.load_cube(), args.indicator, args.year, args.municipality, args.province)
+        chunks = export(args.path, selection, fmt, layout=args.layout, geometry=args.geometry, chunk=args.chunk)
+    except (ValueError, FileNotFoundError, ImportError) as e:
+        parser.error(str(e))
+    print(f"Wrote {args.path}: {len(selection.municipalities)} municipalities x {len(selection.indicators)} "
+          f"indicators x {len(selection.years)} years in {chunks} chunk(s), {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,75 @@
+"""Write the pydeck GeoJSON payload directly from geometry and attribute arrays.
+
+The geometry of every municipality is encoded to a GeoJSON fragment once per
+geometry version; a render only encodes the per-feature properties and splices
+them in, instead of ``to_json`` -> ``json.loads`` -> mutate -> ``json.dumps``.
+"""
+import json
+from functools import lru_cache
+
+import numpy as np
+import pydeck as pdk
+import shapely
+
+import geostore
+import lod
+
+
+@lru_cache(maxsize=len(lod.TIERS) * 2)
+def _encode_geometry(version, tier):
+    return shapely.to_geojson(lod.load_tier_index(tier)).tolist()
+
+
+def encoded_geometry(zoom=None):
+    """Return one pre-encoded GeoJSON geometry string per municipality (WGS84).
+
+    The geometry detail follows the level-of-detail tier for ``zoom``.
+    """
+    return _encode_geometry(geostore.geometry_version(), lod.tier_for_zoom(zoom))
+
+
+def _encode_column(values):
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        # NaN is not valid JSON
+        values = np.where(np.isnan(values), None, values)
+    return [json.dumps(value) for value in values.tolist()]
+
+
+def feature_collection(geometries, **properties):
+    """Return a GeoJSON FeatureCollection string.
+
+    ``geometries`` are pre-encoded geometry fragments and every keyword is a
+    property column with one value (or one row, e.g. an RGB color) per feature.
+    """
+    names = [json.dumps(name) for name in properties]
+    columns = [_encode_column(values) for values in properties.values()]
+    features = []
+    for geometry, row in zip(geometries, zip(*columns)):
+        props = ",".join(f"{name}:{value}" for name, value in zip(names, row))
+        features.append(f'{{"type":"Feature","geometry":{geometry},"properties":{{{props}}}}}')
+    return '{"type":"FeatureCollection","features":[' + ",".join(features) + "]}"
+
+
+class RawDataDeck(pdk.Deck):
+    """pydeck Deck that splices pre-serialized JSON into its layers.
+
+    A layer created with ``data="<placeholder>"`` gets ``raw_data["<placeholder>"]``
+    inserted verbatim when the deck is serialized, so the payload is never
+    parsed or re-encoded by pydeck.
+    """
+
+    def __init__(self, *args, raw_data=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._raw_data = raw_data or {}
+
+    def to_json(self):
+        # Keep the payloads out of pydeck's own attribute serialization
+        raw_data = self.__dict__.pop("_raw_data")
+        try:
+            spec = super().to_json()
+        finally:
+            self._raw_data = raw_data
+        for placeholder, payload in raw_data.items():
+            spec = spec.replace(json.dumps(placeholder), payload, 1)
+        return spec
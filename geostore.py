@@ -0,0 +1,86 @@
+"""Shared municipality geometry for all indicator and theme files.
+
+Every Indicator_*.geojson and Theme*.geojson repeats the same 342
+municipality boundaries. The boundaries are parsed once per process from
+GEOMETRY_SOURCE; each indicator file is only read as a thin attribute
+table, keyed on ``statcode`` (see indicatorcube.py).
+
+geopandas is only imported when a file is actually read, so tools that just
+need the constants or a cached cube stay light.
+"""
+import hashlib
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+import datacache
+
+# Any of the indicator files will do, they all carry identical boundaries
+GEOMETRY_SOURCE = "Indicator_01_KL_H_01.geojson"
+KEY = "statcode"
+# Web maps (pydeck, folium) need WGS84, the sources are in RD New (EPSG:28992)
+WEB_CRS = 4326
+
+# WGS84 boundaries plus the values the map views need, computed once per geometry version
+ProjectedGeometry = namedtuple("ProjectedGeometry", ["boundaries", "centroids", "bounds", "center"])
+
+_hashes = {}
+
+
+def source_hash(path):
+    """SHA-1 of a source file, only recomputed when its size or mtime changes."""
+    stat = os.stat(path)
+    marker = (stat.st_size, stat.st_mtime_ns)
+    cached = _hashes.get(path)
+    if cached is None or cached[0] != marker:
+        with open(path, "rb") as f:
+            cached = (marker, hashlib.sha1(f.read()).hexdigest())
+        _hashes[path] = cached
+    return cached[1]
+
+
+def geometry_version():
+    """Version of the shared geometry, changes whenever GEOMETRY_SOURCE does."""
+    return source_hash(GEOMETRY_SOURCE)
+
+
+def load_geometry():
+    """Return the municipality boundaries (statcode, statnaam, geometry)."""
+    return _read_geometry(geometry_version())
+
+
+def load_geometry_wgs84():
+    """Return the boundaries reprojected to WGS84 with centroids, bounds and center."""
+    return _project_geometry(geometry_version())
+
+
+@lru_cache(maxsize=1)
+def _read_geometry(version):
+    import geopandas as gpd
+
+    boundaries = gpd.read_file(GEOMETRY_SOURCE)
+    boundaries = boundaries[boundaries.geometry.notnull()]
+    return boundaries[[KEY, "statnaam", "geometry"]].reset_index(drop=True)
+
+
+@lru_cache(maxsize=1)
+def _project_geometry(version):
+    boundaries = _read_geometry(version)
+    # Centroids are computed in RD, where they are meaningful, and projected afterwards
+    centroids = boundaries.geometry.centroid.to_crs(epsg=WEB_CRS)
+    projected = boundaries.to_crs(epsg=WEB_CRS)
+    center = (centroids.y.mean(), centroids.x.mean())
+    return ProjectedGeometry(projected, centroids, tuple(projected.total_bounds), center)
+
+
+def load_attributes(path):
+    """Return the attribute table of an indicator file, without geometry."""
+    return datacache.cache.get(("attributes", path), lambda: _read_attributes(path), sources=[path])
+
+
+def _read_attributes(path):
+    import geopandas as gpd
+
+    attributes = gpd.read_file(path, ignore_geometry=True)
+    # Some exports carry an empty trailing feature without a statcode
+    return attributes[attributes[KEY].notnull()].reset_index(drop=True)
@@ -0,0 +1,116 @@
+"""Import-time report for the dashboard dependencies.
+
+Runs ``python -X importtime`` in fresh interpreters, so the numbers are the
+cold-start cost a new container pays. Shown on the debug page
+(``?page=debug``, only with ``CMON_DEBUG=1`` as measuring starts a dozen
+interpreters on the server) or from the command line:
+
+    python importprofile.py [module ...]
+"""
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+ENABLED = os.environ.get("CMON_DEBUG", "") not in ("", "0")
+
+# What the dashboard pages import, heaviest first
+DASHBOARD_MODULES = [
+    "streamlit",
+    "geopandas",
+    "pandas",
+    "numpy",
+    "shapely",
+    "pydeck",
+    "matplotlib.pyplot",
+    "folium",
+    "altair",
+    "plotly.express",
+    "registry",
+    "indicatorcube",
+    "geostore",
+    "geojsonwriter",
+]
+
+
+def _run_importtime(modules):
+    code = "; ".join(f"import {module}" for module in modules) or "pass"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=False,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package", nesting is indented
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append({
+            "module": name.strip(),
+            "depth": depth,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    return rows, result.returncode
+
+
+def _total_ms(rows):
+    return sum(row["cumulative_ms"] for row in rows if row["depth"] == 0)
+
+
+def standalone_times(modules=DASHBOARD_MODULES):
+    """Cold import time of each module on its own, in parallel fresh interpreters.
+
+    The interpreter's own startup imports are measured once and subtracted.
+    """
+    baseline_rows, _ = _run_importtime([])
+    baseline_ms = _total_ms(baseline_rows)
+
+    def measure(module):
+        rows, returncode = _run_importtime([module])
+        return {
+            "module": module,
+            "cold_ms": round(_total_ms(rows) - baseline_ms, 1),
+            "modules_loaded": len(rows) - len(baseline_rows),
+            "ok": returncode == 0,
+        }
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(measure, modules))
+    return sorted(results, key=lambda row: row["cold_ms"], reverse=True)
+
+
+def slowest_imports(modules=DASHBOARD_MODULES, n=25):
+    """The ``n`` imports with the highest self time when importing everything together."""
+    rows, _ = _run_importtime(modules)
+    return sorted(rows, key=lambda row: row["self_ms"], reverse=True)[:n]
+
+
+def render():
+    import streamlit as st
+
+    st.title("Debug: import time")
+    if not ENABLED:
+        st.warning("De debugpagina staat uit. Start de server met CMON_DEBUG=1 om hem te gebruiken.")
+        return
+    st.write(
+        "Koude importtijd per module, gemeten met `python -X importtime` in een nieuwe interpreter."
+    )
+    loaded = sorted(module for module in DASHBOARD_MODULES if module in sys.modules)
+    st.write(f"Al geladen in dit proces: {', '.join(loaded) or 'geen'}")
+
+    if st.button("Meten"):
+        with st.spinner("Importtijd meten..."):
+            st.markdown("**Per module (los geïmporteerd)**")
+            st.dataframe(standalone_times(), hide_index=True)
+            st.markdown("**Langzaamste imports (alles samen, eigen tijd)**")
+            st.dataframe(slowest_imports(), hide_index=True)
+
+
+if __name__ == "__main__":
+    modules = sys.argv[1:] or DASHBOARD_MODULES
+    print(f"{'module':<24} {'cold ms':>10} {'modules':>8}")
+    for row in standalone_times(modules):
+        flag = "" if row["ok"] else "  (import failed)"
+        print(f"{row['module']:<24} {row['cold_ms']:>10.1f} {row['modules_loaded']:>8}{flag}")
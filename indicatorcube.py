@@ -0,0 +1,266 @@
+"""Columnar indicator cube (municipality x indicator x year).
+
+Built offline from the ``file_options`` registry so the dashboard can read
+indicator values without touching the GeoJSON sources:
+
+    python indicatorcube.py
+
+The cube is stored as a single ``.npz`` file. Registry entries whose file or
+year column is missing are reported and left as NaN in the cube, as are the
+``SENTINEL`` placeholders for missing values.
+"""
+import hashlib
+import os
+
+import numpy as np
+
+import datacache
+import geostore
+import registry
+from registry import file_options
+
+CUBE_PATH = "indicator_cube.npz"
+# Placeholder some source files use for "no value"; read as NaN
+SENTINEL = -99
+
+
+def source_signature(path):
+    """Cheap change marker for a source file: size and mtime, or empty when missing."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return ""
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def entry_signature(info):
+    """Change marker for a registry entry: its file's signature and a digest of its year columns."""
+    columns = "|".join(f"{year}={column}" for year, column in sorted(info["year_columns"].items()))
+    # How a column is read is part of it, so changing the placeholder rebuilds the cube
+    columns += f"|missing={SENTINEL}"
+    return f"{source_signature(info['path'])}#{hashlib.sha1(columns.encode()).hexdigest()[:12]}"
+
+
+def registry_entries(options=file_options):
+    """Yield (name, info) per registry entry, with info None when the entry is malformed."""
+    for name, info in options.items():
+        if not isinstance(info, dict) or "path" not in info or "year_columns" not in info:
+            yield name, None
+        else:
+            yield name, info
+
+
+class YearSlices:
+    """Lookup of (name, year) slices in tables shaped (row, name, year).
+
+    Subclasses call ``_index`` once their name and year axes are known;
+    ``values`` and ``available_years`` read the table from ``data``.
+    """
+
+    def _index(self, names, years):
+        self._name_pos = {name: i for i, name in enumerate(names)}
+        self._year_pos = {str(year): j for j, year in enumerate(years)}
+
+    def _position(self, name, year):
+        """Positions of a name and year, None for either when it is not in the table."""
+        return self._name_pos.get(name), self._year_pos.get(str(year))
+
+    def __contains__(self, name):
+        return name in self._name_pos
+
+    def values(self, name, year):
+        """Return the values of one name and year, NaN where unavailable."""
+        i, j = self._position(name, year)
+        if i is None or j is None:
+            return np.full(self.data.shape[0], np.nan)
+        return self.data[:, i, j]
+
+    def available_years(self, name):
+        """Return the years that hold at least one value for the name."""
+        i = self._name_pos.get(name)
+        if i is None:
+            return []
+        filled = ~np.isnan(self.data[:, i, :]).all(axis=0)
+        return [year for year, ok in zip(self.years, filled) if ok]
+
+
+class IndicatorCube(YearSlices):
+    """Indicator values aligned to the shared geometry's statcode order."""
+
+    def __init__(self, statcodes, indicators, years, data, paths, signatures):
+        self.statcodes = statcodes
+        self.indicators = list(indicators)
+        self.years = list(years)
+        self.data = data
+        self.paths = list(paths)
+        self.signatures = list(signatures)
+        self._index(self.indicators, self.years)
+
+    @property
+    def version(self):
+        """Changes whenever any of the source files or year column mappings changes."""
+        return hashlib.sha1("|".join(self.paths + self.signatures).encode()).hexdigest()
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.statcodes.nbytes
+
+    def signature(self, indicator):
+        """Entry signature the indicator was read with, None when it is not in the cube."""
+        i = self._name_pos.get(indicator)
+        return None if i is None else self.signatures[i + 1]
+
+    def profile(self, position):
+        """(indicator, year, value) of one municipality, by its position in the statcode
+        order, at the latest year it has a value for each indicator."""
+        rows = []
+        for i, name in enumerate(self.indicators):
+            filled = np.flatnonzero(~np.isnan(self.data[position, i, :]))
+            if len(filled):
+                j = filled[-1]
+                rows.append((name, self.years[j], float(self.data[position, i, j])))
+        return rows
+
+    def is_stale(self, options=file_options):
+        """True when a source file or a year column mapping changed since the cube was built."""
+        if self.signatures[0] != source_signature(geostore.GEOMETRY_SOURCE):
+            return True
+        for name, info in registry_entries(options):
+            if info is None:
+                continue
+            i = self._name_pos.get(name)
+            if i is None or self.paths[i + 1] != info["path"]:
+                return True
+            if self.signatures[i + 1] != entry_signature(info):
+                return True
+        return False
+
+    def add_years(self, years):
+        """Extend the year axis with ``years`` (NaN until filled), keeping it sorted."""
+        all_years = sorted(set(self.years) | {str(year) for year in years})
+        if all_years == self.years:
+            return
+        data = np.full((self.data.shape[0], self.data.shape[1], len(all_years)), np.nan)
+        data[:, :, [all_years.index(year) for year in self.years]] = self.data
+        self.data = data
+        self.years = all_years
+        self._index(self.indicators, self.years)
+
+    def set_indicator(self, name, path, signature, values):
+        """Replace (or append) the values of one indicator, ``values`` shaped (municipality, year)."""
+        i = self._name_pos.get(name)
+        if i is None:
+            i = len(self.indicators)
+            empty = np.full((self.data.shape[0], 1, self.data.shape[2]), np.nan)
+            self.data = np.concatenate([self.data, empty], axis=1)
+            self.indicators.append(name)
+            self.paths.append(path)
+            self.signatures.append(signature)
+            self._name_pos[name] = i
+        self.data[:, i, :] = values
+        self.paths[i + 1] = path
+        self.signatures[i + 1] = signature
+
+    def save(self, path=CUBE_PATH):
+        np.savez(
+            path,
+            statcodes=np.asarray(self.statcodes, dtype=str),
+            indicators=np.asarray(self.indicators, dtype=str),
+            years=np.asarray(self.years, dtype=str),
+            data=self.data,
+            paths=np.asarray(self.paths, dtype=str),
+            signatures=np.asarray(self.signatures, dtype=str),
+        )
+
+    @classmethod
+    def read(cls, path=CUBE_PATH):
+        with np.load(path) as npz:
+            return cls(
+                npz["statcodes"], npz["indicators"].tolist(), npz["years"].tolist(),
+                npz["data"], npz["paths"].tolist(), npz["signatures"].tolist(),
+            )
+
+
+def read_indicator(name, info, statcodes, years):
+    """Values of one registry entry as (municipality, year) in ``statcodes`` order.
+
+    Returns the values and a list of problems (missing file or columns).
+    """
+    import pandas as pd
+
+    values = np.full((len(statcodes), len(years)), np.nan)
+    path = info["path"]
+    if not os.path.exists(path):
+        return values, [f"{name}: file not found: {path}"]
+    problems = []
+    attributes = geostore.load_attributes(path).set_index(geostore.KEY)
+    attributes = attributes.reindex(statcodes)
+    for year, column in info["year_columns"].items():
+        if column not in attributes.columns:
+            problems.append(f"{name}: column {column} for {year} not found in {path}")
+            continue
+        column_values = pd.to_numeric(attributes[column], errors="coerce").to_numpy(dtype=float)
+        values[:, years.index(year)] = np.where(column_values == SENTINEL, np.nan, column_values)
+    return values, problems
+
+
+def build_cube(options=file_options):
+    """Walk the registry and collect every mapped column into a cube.
+
+    Returns the cube and a list of problems found in the registry.
+    """
+    statcodes = geostore.load_geometry()[geostore.KEY]
+    entries = []
+    problems = []
+    for name, info in registry_entries(options):
+        if info is None:
+            problems.append(f"{name}: malformed registry entry")
+        else:
+            entries.append((name, info))
+    years = sorted({year for _, info in entries for year in info["year_columns"]})
+
+    data = np.full((len(statcodes), len(entries), len(years)), np.nan)
+    # Position 0 is the geometry source, followed by one entry per indicator
+    paths = [geostore.GEOMETRY_SOURCE]
+    signatures = [source_signature(geostore.GEOMETRY_SOURCE)]
+    for i, (name, info) in enumerate(entries):
+        paths.append(info["path"])
+        signatures.append(entry_signature(info))
+        data[:, i, :], entry_problems = read_indicator(name, info, statcodes, years)
+        problems += entry_problems
+
+    cube = IndicatorCube(
+        statcodes.to_numpy(dtype=str), [name for name, _ in entries], years, data, paths, signatures
+    )
+    return cube, problems
+
+
+def load_cube(path=CUBE_PATH):
+    """Return the indicator cube, (re)building it when missing or out of date.
+
+    The loaded cube is kept in the process-wide data cache until the cube file
+    or one of its sources changes.
+    """
+    # The overlay adds year columns to the registry, see ingest.py
+    sources = [path, geostore.GEOMETRY_SOURCE, registry.OVERLAY_PATH]
+    sources += [info["path"] for _, info in registry_entries() if info is not None]
+    return datacache.cache.get(("cube", path), lambda: _load_cube(path), sources=sources)
+
+
+def _load_cube(path):
+    if os.path.exists(path):
+        cube = IndicatorCube.read(path)
+        if not cube.is_stale():
+            return cube
+    cube, _ = build_cube()
+    cube.save(path)
+    return cube
+
+
+if __name__ == "__main__":
+    cube, problems = build_cube()
+    cube.save(CUBE_PATH)
+    print(f"Wrote {CUBE_PATH}: {len(cube.statcodes)} municipalities x "
+          f"{len(cube.indicators)} indicators x {len(cube.years)} years")
+    for problem in problems:
+        print(f"  - {problem}")
@@ -0,0 +1,228 @@
+"""Incremental ingestion of new year columns into the indicator cube.
+
+    python ingest.py [--dry-run] [--no-ranking]
+
+Only source files whose size or mtime differ from what the cube was built
+with are read. In those, new year columns are recognised from the naming of
+the columns the registry already maps:
+
+- a year in the name: ``Year2016`` -> ``Year2023``, ``NorOver16`` -> ``NorOver24``
+- a counter that steps with the year: ``F_017_Mean`` (2020), ``F_018_Mean``
+  (2021) -> ``F_019_Mean`` (2022)
+
+Numeric columns of a changed file that match neither are reported, so a
+column named differently (``F_01K_Me_1``) is not silently left out. The
+naming cases are doctests: ``python -m doctest ingest.py``.
+
+New columns are written to ``registry_overlay.json`` (merged into the
+registry), the changed indicators are replaced in the cube, and new rows are
+appended to the ranking table. The hot-spot results (autocorr.py) are
+updated for the changed columns. Everything derived is keyed so that only what
+depends on the new data is recomputed: theme scores and the static map file
+follow the cube version, rendered maps are keyed by their values, and
+unchanged indicators keep their cached attribute tables and images.
+A change to the shared geometry still means a full rebuild.
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+import autocorr
+import geostore
+import indicatorcube
+import registry
+from registry import file_options
+
+RANKING_CSV = "indmaarmunn.csv"
+# Numeric attributes of every source file that are not indicator values
+METADATA_COLUMNS = {"Jaar", "Shape__Are", "Shape__Len"}
+
+
+def _templates(year_columns):
+    """Regexes for the year-in-name patterns of the mapped columns."""
+    patterns = set()
+    for year, column in year_columns.items():
+        for digits, base in ((year, 0), (year[2:], 2000)):
+            # Only as a number of its own: the 18 in F_185_Me_1 or F_09EV018 is no year
+            matches = list(re.finditer(rf"(?<!\d){digits}(?!\d)", column))
+            if matches:
+                prefix, suffix = column[:matches[-1].start()], column[matches[-1].end():]
+                patterns.add((re.escape(prefix) + rf"(\d{{{len(digits)}}})" + re.escape(suffix), base))
+                break
+    return [(re.compile(f"^{pattern}$"), base) for pattern, base in patterns]
+
+
+def _counter_series(year_columns, columns):
+    """Continue a column counter that steps by one per year, as long as the columns exist."""
+    mapped = sorted(year_columns.items())
+    if len(mapped) < 2:
+        return {}
+    (prev_year, prev), (last_year, last) = mapped[-2], mapped[-1]
+    prefix = os.path.commonprefix([prev, last])
+    suffix = os.path.commonprefix([prev[::-1], last[::-1]])[::-1]
+    prev_mid, last_mid = prev[len(prefix):len(prev) - len(suffix)], last[len(prefix):len(last) - len(suffix)]
+    if not (prev_mid.isdigit() and last_mid.isdigit()):
+        return {}
+    step = int(last_mid) - int(prev_mid)
+    if step <= 0 or step != int(last_year) - int(prev_year):
+        return {}
+    found = {}
+    year, counter = int(last_year), int(last_mid)
+    while True:
+        year, counter = year + 1, counter + 1
+        column = f"{prefix}{counter:0{len(last_mid)}d}{suffix}"
+        if column not in columns:
+            return found
+        found[str(year)] = column
+
+
+def new_year_columns(year_columns, columns):
+    """Year -> column for columns in ``columns`` that continue the registry's naming
+    past its latest year.
+
+    >>> new_year_columns({"2016": "Year2016"}, ["Year2016", "Year2023"])
+    {'2023': 'Year2023'}
+    >>> new_year_columns({"2016": "NorOver16"}, ["NorOver16", "NorOver24"])
+    {'2024': 'NorOver24'}
+    >>> new_year_columns({"2020": "F_017_Mean", "2021": "F_018_Mean"}, ["F_017_Mean", "F_018_Mean", "F_019_Mean"])
+    {'2022': 'F_019_Mean'}
+    >>> new_year_columns({"2021": "F_09EV021", "2022": "F_09EV022"}, ["F_09EV021", "F_09EV022", "F_09EV023"])
+    {'2023': 'F_09EV023'}
+
+    Digits within a longer number are not a year:
+
+    >>> new_year_columns({"2018": "F_185_Me_1"}, ["F_185_Me_1", "F_195_Me_1"])
+    {}
+    >>> new_year_columns({"2018": "F_09EV018"}, ["F_09EV018", "F_09EV019"])
+    {}
+    >>> new_year_columns({"2011": "F_011_Mean"}, ["F_011_Mean", "F_018_Mean"])
+    {}
+
+    A column that breaks the naming is not guessed; see ``unmapped_columns``:
+
+    >>> new_year_columns({"2020": "F_017_Mean", "2021": "F_018_Mean"}, ["F_017_Mean", "F_018_Mean", "F_01K_Me_1"])
+    {}
+    """
+    columns = set(columns)
+    mapped = set(year_columns.values())
+    found = {}
+    templates = _templates(year_columns)
+    for column in sorted(columns - mapped):
+        for pattern, base in templates:
+            match = pattern.match(column)
+            if match:
+                found[str(base + int(match.group(1)))] = column
+                break
+    for year, column in _counter_series(year_columns, columns).items():
+        found.setdefault(year, column)
+    # Only years after the latest mapped one; earlier gaps in the registry are left alone
+    latest = max(year_columns, default="")
+    return {year: column for year, column in sorted(found.items()) if year > latest}
+
+
+def unmapped_columns(attributes, year_columns):
+    """Numeric columns of an attribute table that no year maps to."""
+    known = set(year_columns.values()) | METADATA_COLUMNS | {geostore.KEY}
+    return [column for column in attributes.select_dtypes("number").columns if column not in known]
+
+
+def detect_changes(cube, options=file_options):
+    """(name, info, signature, new year columns, unmapped numeric columns) per registry
+    entry whose file or year columns changed."""
+    changes = []
+    for name, info in indicatorcube.registry_entries(options):
+        if info is None or not os.path.exists(info["path"]):
+            continue
+        signature = indicatorcube.entry_signature(info)
+        if cube is not None and cube.signature(name) == signature:
+            continue
+        attributes = geostore.load_attributes(info["path"])
+        new = new_year_columns(info["year_columns"], attributes.columns)
+        unmapped = unmapped_columns(attributes, {**info["year_columns"], **new})
+        changes.append((name, info, signature, new, unmapped))
+    return changes
+
+
+def write_overlay(additions, path=registry.OVERLAY_PATH):
+    overlay = registry.load_overlay(path)
+    for name, year_columns in additions.items():
+        overlay[name] = dict(sorted({**overlay.get(name, {}), **year_columns}.items()))
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(overlay, f, indent=4, ensure_ascii=False)
+    os.replace(tmp, path)
+    registry.refresh(path)
+
+
+def append_ranking_rows(cube, additions, path=RANKING_CSV):
+    """Append the values of new (indicator, year) pairs to the long ranking table."""
+    import pandas as pd
+
+    table = pd.read_csv(path, usecols=["label", "jaar"])
+    present = set(zip(table["label"], table["jaar"].astype(str)))
+    names = geostore.load_geometry()["statnaam"].to_numpy()
+    frames = [
+        pd.DataFrame({"label": name, "jaar": int(year), "waarde": cube.values(name, year), "statnaam": names})
+        for name, year_columns in additions.items()
+        for year in year_columns
+        if (name, year) not in present
+    ]
+    if not frames:
+        return 0
+    header = pd.read_csv(path, nrows=0).columns
+    rows = pd.concat(frames).reindex(columns=header)
+    rows.to_csv(path, mode="a", header=False, index=False)
+    return len(rows)
+
+
+def ingest(cube_path=indicatorcube.CUBE_PATH, dry_run=False, ranking_csv=RANKING_CSV, log=print):
+    start = time.perf_counter()
+    cube = indicatorcube.IndicatorCube.read(cube_path) if os.path.exists(cube_path) else None
+    geometry_changed = (
+        cube is not None and cube.signatures[0] != indicatorcube.source_signature(geostore.GEOMETRY_SOURCE)
+    )
+    changes = detect_changes(None if geometry_changed else cube)
+    additions = {name: new for name, _, _, new, _ in changes if new}
+
+    log(f"{len(changes)} changed source file(s)")
+    for name, _, _, new, unmapped in changes:
+        found = ", ".join(f"{year}: {column}" for year, column in new.items()) or "no new year columns"
+        log(f"  {name}: {found}")
+        if unmapped:
+            log(f"    numeric columns not mapped to a year: {', '.join(unmapped)}")
+    if dry_run or not changes:
+        return changes
+
+    if additions:
+        write_overlay(additions)
+    if cube is None or geometry_changed:
+        log("No cube or the geometry changed, rebuilding everything")
+        cube, _ = indicatorcube.build_cube()
+    else:
+        cube.add_years(year for new in additions.values() for year in new)
+        for name, info, _, _, _ in changes:
+            values, problems = indicatorcube.read_indicator(name, file_options[name], cube.statcodes, cube.years)
+            for problem in problems:
+                log(f"  - {problem}")
+            # The signature covers the year columns, which the overlay may just have extended
+            cube.set_indicator(name, info["path"], indicatorcube.entry_signature(file_options[name]), values)
+    cube.save(cube_path)
+    if cube_path == indicatorcube.CUBE_PATH:
+        # Hot-spot results of the changed columns, so the dashboard does not compute them
+        _, computed = autocorr.update()
+        log(f"Updated {autocorr.RESULTS_PATH}: {computed} column(s) computed")
+
+    if additions and ranking_csv and os.path.exists(ranking_csv):
+        log(f"Appended {append_ranking_rows(cube, additions, ranking_csv)} rows to {ranking_csv}")
+    log(f"Done in {time.perf_counter() - start:.1f} s")
+    return changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    parser.add_argument("--no-ranking", action="store_true", help=f"do not append rows to {RANKING_CSV}")
+    args = parser.parse_args()
+    ingest(dry_run=args.dry_run, ranking_csv=None if args.no_ranking else RANKING_CSV)
@@ -0,0 +1,368 @@
+"""Load test of the dashboard with many concurrent simulated sessions.
+
+    python loadtest.py                          # 1, 5, 10 and 30 sessions, compare with the baseline
+    python loadtest.py --sessions 10 30 50 --steps 30 --think 2
+    python loadtest.py --save                   # store the results as the new baseline
+
+The harness starts ``streamlit run Cmon.py`` headless on a free local port and
+connects every session over the websocket like a browser tab, speaking
+Streamlit's protobuf protocol with tornado's websocket client. A session
+opens the page and then makes ``--steps`` random switches: themes or
+indicators, indicator (full rerun), year or classification (map fragment)
+and ranking order (ranking fragment), with an exponential think time of mean
+``--think`` seconds in between. The latency of a switch is the time from
+sending the widget change to the server's "script finished", so it includes
+serialisation and the websocket transfer, but not the rendering in the
+browser. Everything runs offline on this machine.
+
+Streamlit's ``AppTest`` is not used: it swaps a process-wide runtime for every
+run, so concurrent AppTests in one process get in each other's way.
+
+Per concurrency level the report gives the p50/p95/p99 latency of the
+switches, the page loads separately, reruns per second, the CPU used by the
+server process (in cores) and its RSS at the end of the level and at its
+peak during the level. The CPU of the harness itself is reported too, as it
+shares the machine with the server. A level regresses when its p95 grows by
+more than ``--threshold`` over the baseline or it has more errors; the run
+then exits with status 1.
+"""
+import argparse
+import asyncio
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.websocket import websocket_connect
+
+import baselines
+
+APP = "Cmon.py"
+BASELINE_PATH = "loadtest_baseline.json"
+DEFAULT_SESSIONS = (1, 5, 10, 30)
+DEFAULT_THRESHOLD = 0.25
+# p95 differences below this are noise, in seconds
+MIN_DELTA = 0.05
+TIMEOUT = 120
+STARTUP_TIMEOUT = 60
+# Same as Streamlit's server.maxMessageSize
+MAX_MESSAGE = 200 * 2**20
+SAMPLE_INTERVAL = 0.2
+
+# Relative frequency of each kind of switch, and the widget it changes
+ACTIONS = {"type": 1, "indicator": 3, "year": 4, "scheme": 1, "order": 2}
+LABELS = {
+    "type": "what would you like to visualise ?",
+    "indicator": "Select a Theme/an Indicator:",
+    "year": "Selecteer een jaar:",
+    "scheme": "Klassenindeling:",
+    "order": "Van hoog naar laag",
+}
+WIDGETS = ("selectbox", "radio", "checkbox")
+
+
+class Session:
+    """One simulated browser tab on the server's websocket."""
+
+    def __init__(self, url):
+        self.url = url
+        self.connection = None
+        # label -> (kind, widget proto, fragment id) as last sent by the server
+        self.widgets = {}
+        # widget id -> WidgetState of every widget changed so far, sent with each rerun
+        self.states = {}
+
+    async def connect(self):
+        self.connection = await websocket_connect(
+            self.url, subprotocols=["streamlit"], max_message_size=MAX_MESSAGE
+        )
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+    def change(self, label, rng):
+        """Pick a new value for the widget labelled ``label``; returns its fragment id.
+
+        Returns None when the widget has nothing to pick, e.g. the years of an
+        indicator without data.
+        """
+        if label not in self.widgets:
+            raise LookupError(f"no widget labelled {label!r}")
+        kind, widget, fragment_id = self.widgets[label]
+        current = self.states.get(widget.id)
+        state = WidgetState(id=widget.id)
+        if kind == "checkbox":
+            state.bool_value = not (current.bool_value if current is not None else widget.default)
+        elif widget.options:
+            index = current.int_value if current is not None else widget.default
+            # Another option than the current one, as a user would pick
+            others = [i for i in range(len(widget.options)) if i != index] or [index]
+            state.int_value = rng.choice(others)
+        else:
+            return None
+        self.states[widget.id] = state
+        return fragment_id
+
+    async def rerun(self, fragment_id=""):
+        """Send the widget states and wait for the run to finish; returns (seconds, errors)."""
+        msg = BackMsg()
+        msg.rerun_script.widget_states.widgets.extend(self.states.values())
+        msg.rerun_script.fragment_id = fragment_id
+        start = time.perf_counter()
+        await self.connection.write_message(msg.SerializeToString(), binary=True)
+        errors, seen = [], set()
+        while True:
+            payload = await self.connection.read_message()
+            if payload is None:
+                raise ConnectionError("the server closed the websocket")
+            forward = ForwardMsg()
+            forward.ParseFromString(payload)
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                self._element(forward.delta, errors, seen)
+            elif kind == "script_finished":
+                seconds = time.perf_counter() - start
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    errors.append(f"{APP} does not compile")
+                if not fragment_id:
+                    # Widgets that were not drawn in a full run are gone
+                    self.states = {key: state for key, state in self.states.items() if key in seen}
+                return seconds, errors
+
+    def _element(self, delta, errors, seen):
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        if kind == "exception":
+            errors.append(f"{element.exception.type}: {element.exception.message}")
+        elif kind in WIDGETS:
+            widget = getattr(element, kind)
+            self.widgets[widget.label] = (kind, widget, delta.fragment_id)
+            seen.add(widget.id)
+
+
+async def run_session(url, number, steps, think, seed, samples, errors, skipped):
+    rng = random.Random(seed * 1000 + number)
+    actions, weights = list(ACTIONS), list(ACTIONS.values())
+    session = Session(url)
+    try:
+        await session.connect()
+        seconds, failures = await asyncio.wait_for(session.rerun(), TIMEOUT)
+        samples.append(("load", seconds))
+        errors.extend(failures)
+        for _ in range(steps):
+            if think:
+                await asyncio.sleep(rng.expovariate(1 / think))
+            action = rng.choices(actions, weights)[0]
+            try:
+                fragment_id = session.change(LABELS[action], rng)
+            except LookupError as e:
+                errors.append(str(e))
+                continue
+            if fragment_id is None:
+                skipped.append(action)
+                continue
+            seconds, failures = await asyncio.wait_for(session.rerun(fragment_id), TIMEOUT)
+            samples.append((action, seconds))
+            errors.extend(failures)
+    except asyncio.TimeoutError:
+        # The session is out of step with the server after a timeout, so it ends here
+        errors.append(f"no response within {TIMEOUT} s")
+    except Exception as e:
+        # A crashed session counts as an error instead of ending the level
+        errors.append(f"{type(e).__name__}: {e}")
+    finally:
+        session.close()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, log=None):
+    """Start the dashboard headless on ``port`` and wait until it is healthy."""
+    command = [
+        sys.executable, "-m", "streamlit", "run", APP,
+        "--server.headless=true", f"--server.port={port}", "--server.address=127.0.0.1",
+        "--server.fileWatcherType=none", "--browser.gatherUsageStats=false",
+    ]
+    output = open(log, "w", encoding="utf-8") if log else subprocess.DEVNULL
+    server = subprocess.Popen(command, stdout=output, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"streamlit exited with status {server.returncode} on startup")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"streamlit did not start within {STARTUP_TIMEOUT} s")
+
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def _server_cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat", encoding="ascii") as f:
+        # The fields after the command name, which may contain spaces
+        fields = f.read().rpartition(")")[2].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _server_rss(pid):
+    """RSS of the server in bytes, from /proc on Linux."""
+    with open(f"/proc/{pid}/status", encoding="ascii") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key == "VmRSS":
+                return int(rest.split()[0]) * 1024
+    return 0
+
+
+def _own_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _percentiles(values):
+    if not len(values):
+        return {"p50_s": None, "p95_s": None, "p99_s": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50_s": round(float(p50), 4), "p95_s": round(float(p95), 4), "p99_s": round(float(p99), 4)}
+
+
+async def run_level(url, pid, sessions, steps, think, seed):
+    """Drive ``sessions`` concurrent sessions; returns the measurements of the level."""
+    samples, errors, skipped = [], [], []
+    peak_rss = _server_rss(pid)
+
+    async def sample_rss():
+        nonlocal peak_rss
+        while True:
+            await asyncio.sleep(SAMPLE_INTERVAL)
+            peak_rss = max(peak_rss, _server_rss(pid))
+
+    sampler = asyncio.create_task(sample_rss())
+    cpu_start, own_start, wall_start = _server_cpu_seconds(pid), _own_cpu_seconds(), time.perf_counter()
+    await asyncio.gather(*(
+        run_session(url, number, steps, think, seed, samples, errors, skipped) for number in range(sessions)
+    ))
+    wall = time.perf_counter() - wall_start
+    cpu, own = _server_cpu_seconds(pid) - cpu_start, _own_cpu_seconds() - own_start
+    sampler.cancel()
+    rss = _server_rss(pid)
+
+    reruns = np.array([seconds for action, seconds in samples if action != "load"])
+    loads = np.array([seconds for action, seconds in samples if action == "load"])
+    return {
+        "sessions": sessions,
+        "reruns": len(reruns),
+        "skipped": len(skipped),
+        "errors": len(errors),
+        "error_examples": sorted(set(errors))[:3],
+        **_percentiles(reruns),
+        "load": _percentiles(loads),
+        "by_action": {
+            action: _percentiles(np.array([s for a, s in samples if a == action])) for action in ACTIONS
+        },
+        "reruns_per_s": round(len(reruns) / wall, 2),
+        "cpu_cores": round(cpu / wall, 2),
+        "client_cpu_cores": round(own / wall, 2),
+        "rss_mb": round(rss / 2**20, 1),
+        "peak_rss_mb": round(max(peak_rss, rss) / 2**20, 1),
+        "wall_s": round(wall, 2),
+    }
+
+
+def run(levels, steps, think, seed, warmup=True, server_log=None, log=print):
+    port = _free_port()
+    server = start_server(port, server_log)
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    results = {}
+    try:
+        if warmup:
+            # Fill the process-wide caches first, as on a server that has been up for a while
+            asyncio.run(run_level(url, server.pid, 1, 1, 0, seed))
+        for sessions in levels:
+            results[str(sessions)] = level = asyncio.run(run_level(url, server.pid, sessions, steps, think, seed))
+            ms = {
+                key: f"{level[key] * 1000:7.0f}" if level[key] is not None else "      -"
+                for key in ("p50_s", "p95_s", "p99_s")
+            }
+            log(f"{sessions:>4} sessions: p50 {ms['p50_s']} ms  p95 {ms['p95_s']} ms  "
+                f"p99 {ms['p99_s']} ms  {level['reruns_per_s']:6.1f} reruns/s  "
+                f"CPU {level['cpu_cores']:.2f} cores (client {level['client_cpu_cores']:.2f})  "
+                f"RSS {level['rss_mb']:.0f} MiB (peak {level['peak_rss_mb']:.0f})"
+                + (f"  {level['errors']} error(s)" if level["errors"] else ""))
+            if server.poll() is not None:
+                level["server_exit"] = server.returncode
+                log(f"The server exited with status {server.returncode}; stopping")
+                break
+    finally:
+        stop_server(server)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "steps": steps,
+            "think_s": think,
+            "seed": seed,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Return a list of regressions of ``current`` against ``baseline``."""
+    regressions = []
+    for sessions, level in current["results"].items():
+        base = baseline["results"].get(sessions)
+        if base is None:
+            continue
+        if base["p95_s"] is not None and level["p95_s"] is not None:
+            old, new = base["p95_s"], level["p95_s"]
+            if new > old * (1 + threshold) and new - old > MIN_DELTA:
+                regressions.append(f"{sessions} sessions: p95 {old * 1000:.0f} ms -> {new * 1000:.0f} ms")
+        if level["errors"] > base["errors"]:
+            regressions.append(f"{sessions} sessions: errors {base['errors']} -> {level['errors']}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", nargs="+", type=int, default=list(DEFAULT_SESSIONS),
+                        help="concurrency levels (default: %(default)s)")
+    parser.add_argument("--steps", type=int, default=20, help="switches per session (default: 20)")
+    parser.add_argument("--think", type=float, default=0.0, help="mean think time in seconds (default: 0)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed of the sessions (default: 1)")
+    parser.add_argument("--no-warmup", action="store_true", help="include the cold start in the first level")
+    parser.add_argument("--server-log", help="write the output of the streamlit server to this file")
+    baselines.add_arguments(parser, BASELINE_PATH, DEFAULT_THRESHOLD, growth="growth of p95")
+    args = parser.parse_args()
+
+    current = run(args.sessions, args.steps, args.think, args.seed, warmup=not args.no_warmup,
+                  server_log=args.server_log, log=lambda line: print(line, flush=True))
+
+    baselines.check(args, current, compare)
@@ -0,0 +1,73 @@
+"""Simplified municipality boundaries per zoom tier (level of detail).
+
+The boundaries are simplified in RD New (metres) with a coverage-aware
+simplification, so neighbouring municipalities keep sharing their edges,
+then reprojected to WGS84 and snapped to a coordinate grid that matches the
+zoom level. Maps pick the tier for their zoom with ``tier_for_zoom``:
+
+    python lod.py    # prints vertex counts and payload size per tier
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+import geopandas as gpd
+import shapely
+
+import geostore
+
+# tolerance in metres (0 keeps every vertex), grid in degrees (0.001 deg is roughly 100 m)
+LodTier = namedtuple("LodTier", ["max_zoom", "tolerance", "grid"])
+
+TIERS = (
+    LodTier(max_zoom=7, tolerance=2500, grid=0.001),
+    LodTier(max_zoom=9, tolerance=1000, grid=0.0001),
+    LodTier(max_zoom=11, tolerance=300, grid=0.0001),
+    LodTier(max_zoom=None, tolerance=0, grid=0.00001),
+)
+
+
+def tier_for_zoom(zoom):
+    """Return the index of the coarsest tier that is detailed enough for the zoom level."""
+    if zoom is None:
+        return len(TIERS) - 1
+    for i, tier in enumerate(TIERS):
+        if tier.max_zoom is None or zoom <= tier.max_zoom:
+            return i
+    return len(TIERS) - 1
+
+
+def _simplify(geometries, tolerance):
+    if tolerance == 0:
+        return geometries
+    if hasattr(shapely, "coverage_simplify"):
+        return shapely.coverage_simplify(geometries, tolerance)
+    # shapely < 2.1: per polygon, shared edges may drift apart slightly
+    return shapely.simplify(geometries, tolerance, preserve_topology=True)
+
+
+def project_tier(geometries, crs, index):
+    """Simplify a coverage in ``crs`` (metres) for a tier and project it to WGS84."""
+    tier = TIERS[index]
+    simplified = gpd.GeoSeries(_simplify(geometries, tier.tolerance), crs=crs)
+    projected = simplified.to_crs(epsg=geostore.WEB_CRS).to_numpy()
+    return shapely.set_precision(projected, tier.grid)
+
+
+@lru_cache(maxsize=len(TIERS) * 2)
+def _build_tier(version, index):
+    boundaries = geostore.load_geometry()
+    return project_tier(boundaries.geometry.to_numpy(), boundaries.crs, index)
+
+
+def load_tier_index(index):
+    """Return the WGS84 geometries of tier ``index`` (see ``tier_for_zoom``), in geostore order."""
+    return _build_tier(geostore.geometry_version(), index)
+
+
+if __name__ == "__main__":
+    for i, tier in enumerate(TIERS):
+        geometries = _build_tier(geostore.geometry_version(), i)
+        size = sum(len(fragment) for fragment in shapely.to_geojson(geometries).tolist())
+        zooms = f"zoom <= {tier.max_zoom}" if tier.max_zoom is not None else "any zoom"
+        print(f"tier {i} ({zooms}): "
+              f"{shapely.get_num_coordinates(geometries).sum()} vertices, {size / 1024:.0f} KiB")
@@ -0,0 +1,73 @@
+"""Static map images for the map download page, rendered once and cached.
+
+Images are keyed by (indicator, year, style, format, geometry version) and a
+digest of the mapped values, so a repeat request is served from memory without touching
+matplotlib. The cache has its own byte budget (``CMON_RENDER_CACHE_MB``,
+default 64) and evicts the least recently used images first. Because the key
+holds the values rather than the cube version, adding a year or indicator to
+the cube keeps the images of everything else cached.
+
+Figures are drawn on the Agg canvas without pyplot, so they never enter
+pyplot's global figure registry and are freed as soon as the bytes are out.
+"""
+import hashlib
+import io
+import os
+from collections import namedtuple
+
+import datacache
+import geostore
+import indicatorcube
+from registry import file_options
+
+DEFAULT_BUDGET_MB = 64
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+MapStyle = namedtuple("MapStyle", ["figsize", "dpi", "cmap", "legend"])
+DEFAULT_STYLE = MapStyle(figsize=(12, 8), dpi=100, cmap="viridis", legend=True)
+
+render_cache = datacache.DataCache(int(os.environ.get("CMON_RENDER_CACHE_MB", DEFAULT_BUDGET_MB)) * 1024 * 1024)
+
+
+def map_title(indicator, year):
+    title_base = file_options.get(indicator, {}).get("title", indicator)
+    return f"{title_base} van Nederland in {year}"
+
+
+def draw_map(indicator, year, style, fmt, cube):
+    """Render one map to image bytes, bypassing the cache."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    boundaries = geostore.load_geometry().copy()
+    boundaries["waarde"] = cube.values(indicator, year)
+
+    fig = Figure(figsize=style.figsize, dpi=style.dpi)
+    FigureCanvasAgg(fig)
+    try:
+        ax = fig.add_axes([0, 0, 1, 1])
+        boundaries.plot(
+            column="waarde",
+            ax=ax,
+            cmap=style.cmap,
+            legend=style.legend,
+            legend_kwds={"orientation": "vertical"},
+        )
+        ax.set_title(map_title(indicator, year))
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=fmt)
+        return buffer.getvalue()
+    finally:
+        # Drop the artists right away instead of waiting for the collector
+        fig.clear()
+
+
+def render_map(indicator, year, style=DEFAULT_STYLE, fmt="png"):
+    """Return the map of an indicator and year as PNG or SVG bytes."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown image format {fmt!r}, expected one of {sorted(FORMATS)}")
+    cube = indicatorcube.load_cube()
+    digest = hashlib.sha1(cube.values(indicator, year).tobytes()).hexdigest()
+    key = (indicator, str(year), style, fmt, geostore.geometry_version(), digest)
+    return render_cache.get(key, lambda: draw_map(indicator, year, style, fmt, cube))
@@ -0,0 +1,105 @@
+"""Send the map geometry once per session, then only colors and hover texts per rerun.
+
+The boundaries are written to one static file per zoom tier under ``static/``
+(served by Streamlit when ``server.enableStaticServing`` is on), with only the
+feature position ``i`` and ``statnaam`` as properties. The pydeck layer
+references that file by URL, which the browser fetches once; deck.gl keeps the
+loaded data as long as the URL does not change. A rerun then only sends two
+tables indexed by feature position:
+
+- the colors, as an accessor expression, and
+- the hover texts, in the tooltip.
+
+The file name carries the geometry version, so new boundaries produce a new
+URL and clients fetch it again.
+"""
+import glob
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pydeck as pdk
+
+import geojsonwriter
+import geostore
+import lod
+
+STATIC_DIR = "static"
+STATIC_URL = "app/static"
+PREFIX = "municipalities"
+
+# Sessions are threads of one process; the first one after a data refresh writes the file
+_write_lock = threading.Lock()
+
+
+def _write_geometry(zoom, tier, path):
+    boundaries = geostore.load_geometry()
+    payload = geojsonwriter.feature_collection(
+        geojsonwriter.encoded_geometry(zoom),
+        i=np.arange(len(boundaries)),
+        statnaam=boundaries["statnaam"].to_numpy(),
+    )
+
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+    # Drop files of older geometry versions for this tier
+    for old in glob.glob(os.path.join(STATIC_DIR, f"{PREFIX}-z{tier}-*.json")):
+        if old != path:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                # Removed by another server process
+                pass
+
+
+def geometry_url(zoom):
+    """Return the URL of the static geometry file for the zoom tier, writing it if needed."""
+    tier = lod.tier_for_zoom(zoom)
+    version = hashlib.sha1(geostore.geometry_version().encode()).hexdigest()[:16]
+    name = f"{PREFIX}-z{tier}-{version}.json"
+    path = os.path.join(STATIC_DIR, name)
+    if not os.path.exists(path):
+        with _write_lock:
+            if not os.path.exists(path):
+                _write_geometry(zoom, tier, path)
+    return f"{STATIC_URL}/{name}"
+
+
+def color_accessor(colors):
+    """deck.gl expression that looks up each feature's color by its position."""
+    table = ",".join(f"[{r},{g},{b}]" for r, g, b in np.asarray(colors).tolist())
+    # jsep only allows indexing after a parenthesized array literal
+    return f"([{table}])[properties.i]"
+
+
+def _css_string(text):
+    # A backslash escape for "<" keeps "</style>" out of the sheet
+    escaped = text.replace("\\", "\\\\").replace('"', '\\"').replace("<", "\\3c ")
+    return f'"{escaped}"'
+
+
+def hover_tooltip(texts):
+    """Pydeck tooltip that shows ``texts[i]`` for the hovered feature.
+
+    The tooltip only fills in feature properties, so the texts go along as a
+    style sheet with one rule per feature position, picked by ``{i}``.
+    """
+    rules = "".join(f".cmon-hover-{i}::after{{content:{_css_string(text)}}}" for i, text in enumerate(texts))
+    return {"html": f'<b class="cmon-hover-{{i}}"></b><style>{rules}</style>'}
+
+
+def color_layer(url, colors, **kwargs):
+    """GeoJsonLayer over the static geometry file, colored from ``colors``."""
+    accessor = color_accessor(colors)
+    return pdk.Layer(
+        "GeoJsonLayer",
+        data=url,
+        get_fill_color=accessor,
+        # deck.gl only re-evaluates accessors when their update trigger changes
+        update_triggers={"getFillColor": hashlib.sha1(accessor.encode()).hexdigest()[:16]},
+        **kwargs,
+    )
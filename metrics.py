@@ -0,0 +1,169 @@
+"""Timing spans and counters for the dashboard render.
+
+Off unless ``CMON_METRICS=1``. When off, ``span`` returns a shared no-op
+context manager and ``count`` returns immediately, so the calls can stay in
+the hot path.
+
+    with metrics.span("classify"):
+        ...
+    metrics.count("rows", len(frame))
+
+Every rerun is a run: ``start_run`` and ``end_run`` bracket it per thread
+(Streamlit runs each session's script in its own thread). The last run of a
+session is shown in the debug sidebar panel; process totals are written in
+Prometheus text format to ``CMON_METRICS_FILE`` (default ``metrics.prom``),
+e.g. for the node_exporter textfile collector.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+ENABLED = os.environ.get("CMON_METRICS", "") not in ("", "0")
+METRICS_FILE = os.environ.get("CMON_METRICS_FILE", "metrics.prom")
+
+# Upper bounds of the span duration histogram, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_NOOP = nullcontext()
+
+_lock = threading.Lock()
+_spans = {}     # name -> [count, total seconds, bucket counts]
+_counters = {}  # name -> total
+_local = threading.local()
+
+
+def _record_span(name, seconds):
+    with _lock:
+        entry = _spans.get(name)
+        if entry is None:
+            entry = _spans[name] = [0, 0.0, [0] * len(BUCKETS)]
+        entry[0] += 1
+        entry[1] += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                entry[2][i] += 1
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run["spans"].append((name, seconds))
+
+
+@contextmanager
+def _timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_span(name, time.perf_counter() - start)
+
+
+def span(name):
+    """Context manager that times a stage of the render."""
+    if not ENABLED:
+        return _NOOP
+    return _timed(name)
+
+
+def count(name, value=1):
+    """Add ``value`` to a counter (payload bytes, rows processed, ...)."""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run["counters"][name] = run["counters"].get(name, 0) + value
+
+
+def start_run(join=False):
+    """Start a run on this thread; returns True when the caller should end it.
+
+    With ``join=True`` (fragments) an active run is joined instead, so a
+    fragment is part of the full rerun around it and a run of its own when
+    it reruns alone.
+    """
+    if not ENABLED:
+        return False
+    if join and getattr(_local, "run", None) is not None:
+        return False
+    _local.run = {"start": time.perf_counter(), "spans": [], "counters": {}}
+    return True
+
+
+def end_run():
+    """Close the current run and return it, updating the metrics file."""
+    run = getattr(_local, "run", None)
+    if run is None:
+        return None
+    _local.run = None
+    run["total"] = time.perf_counter() - run["start"]
+    _record_span("rerun", run["total"])
+    write_prometheus()
+    return run
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus_text():
+    """Process totals of spans, counters and the data cache in Prometheus text format."""
+    import datacache
+
+    with _lock:
+        spans = {name: (n, total, list(buckets)) for name, (n, total, buckets) in _spans.items()}
+        counters = dict(_counters)
+    lines = [
+        "# HELP cmon_span_seconds Duration of dashboard render stages.",
+        "# TYPE cmon_span_seconds histogram",
+    ]
+    for name, (n, total, buckets) in sorted(spans.items()):
+        label = _label(name)
+        for bound, bucket_count in zip(BUCKETS, buckets):
+            lines.append(f'cmon_span_seconds_bucket{{span="{label}",le="{bound}"}} {bucket_count}')
+        lines.append(f'cmon_span_seconds_bucket{{span="{label}",le="+Inf"}} {n}')
+        lines.append(f'cmon_span_seconds_sum{{span="{label}"}} {total:.6f}')
+        lines.append(f'cmon_span_seconds_count{{span="{label}"}} {n}')
+    lines += ["# HELP cmon_events_total Dashboard counters.", "# TYPE cmon_events_total counter"]
+    for name, value in sorted(counters.items()):
+        lines.append(f'cmon_events_total{{name="{_label(name)}"}} {value}')
+
+    stats = datacache.cache.stats()
+    for key in ("hits", "misses", "evictions"):
+        lines += [f"# TYPE cmon_cache_{key}_total counter", f"cmon_cache_{key}_total {stats[key]}"]
+    for key in ("entries", "bytes"):
+        lines += [f"# TYPE cmon_cache_{key} gauge", f"cmon_cache_{key} {stats[key]}"]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path=None):
+    path = path or METRICS_FILE
+    tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
+
+
+def render_sidebar(run):
+    """Debug panel with the stage times and counters of the previous rerun."""
+    import streamlit as st
+    import datacache
+
+    if not ENABLED or run is None:
+        return
+    with st.sidebar.expander("Prestaties (debug)"):
+        st.write(f"Vorige rerun: {run['total'] * 1000:.1f} ms")
+        st.dataframe(
+            [{"stap": name, "ms": round(seconds * 1000, 2)} for name, seconds in run["spans"]],
+            hide_index=True,
+        )
+        if run["counters"]:
+            st.dataframe(
+                [{"teller": name, "waarde": value} for name, value in run["counters"].items()],
+                hide_index=True,
+            )
+        stats = datacache.cache.stats()
+        st.write(
+            f"Datacache: {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['entries']} items, {stats['bytes'] / 2**20:.1f} MiB"
+        )
@@ -0,0 +1,86 @@
+"""Pre-sorted municipality rankings per (indicator label, year).
+
+Built once per data load from the long indicator table (``label``, ``jaar``,
+``waarde``, ``statnaam``), so the ranking table no longer filters and sorts
+the whole frame on every rerun.
+"""
+import numpy as np
+
+import datacache
+
+_EMPTY = (np.empty(0, dtype=np.intp), np.empty(0), 0)
+
+
+class RankingIndex:
+    def __init__(self, df):
+        self.df = df
+        values = df["waarde"].to_numpy(dtype=float)
+        # (label, jaar) -> (row positions, values, number of non-missing values),
+        # ascending by value with missing values last and ties in file order
+        self._groups = {}
+        for key, positions in df.groupby(["label", "jaar"]).indices.items():
+            order = np.argsort(values[positions], kind="stable")
+            positions = positions[order]
+            group_values = values[positions]
+            self._groups[key] = (positions, group_values, int(np.count_nonzero(~np.isnan(group_values))))
+        # label -> latest year with at least one value; indicators are not all updated at once
+        self._latest = {}
+        for (label, jaar), (_, _, filled) in self._groups.items():
+            if filled and (label not in self._latest or jaar > self._latest[label]):
+                self._latest[label] = jaar
+        self._ranks = {}
+
+    @property
+    def nbytes(self):
+        return int(self.df.memory_usage(deep=True).sum()) + sum(
+            positions.nbytes + values.nbytes for positions, values, _ in self._groups.values()
+        )
+
+    def positions(self, label, jaar):
+        """Row positions in ``df`` sorted by ascending value."""
+        return self._groups.get((label, jaar), _EMPTY)[0]
+
+    def latest_year(self, label):
+        """The latest year with a value for ``label``, None when it has none."""
+        return self._latest.get(label)
+
+    def sorted_frame(self, label, jaar=None, ascending=True):
+        """Rows of one indicator and year (default: its latest year with data), sorted by value.
+
+        Missing values come last in either order.
+        """
+        positions, _, filled = self._groups.get((label, self.latest_year(label) if jaar is None else jaar), _EMPTY)
+        if not ascending:
+            positions = np.concatenate([positions[:filled][::-1], positions[filled:]])
+        return self.df.iloc[positions]
+
+    def bottom(self, label, jaar, n):
+        """The ``n`` rows with the lowest values."""
+        positions, _, filled = self._groups.get((label, jaar), _EMPTY)
+        return self.df.iloc[positions[:min(n, filled)]]
+
+    def top(self, label, jaar, n):
+        """The ``n`` rows with the highest values, highest first."""
+        positions, _, filled = self._groups.get((label, jaar), _EMPTY)
+        return self.df.iloc[positions[max(filled - n, 0):filled][::-1]]
+
+    def rank_of(self, label, jaar, statnaam):
+        """1-based ascending rank of a municipality, None when it has no value."""
+        key = (label, jaar)
+        ranks = self._ranks.get(key)
+        if ranks is None:
+            positions, _, filled = self._groups.get(key, _EMPTY)
+            names = self.df["statnaam"].to_numpy()[positions[:filled]]
+            ranks = self._ranks[key] = {name: rank for rank, name in enumerate(names, start=1)}
+        return ranks.get(statnaam)
+
+    def count_below(self, label, jaar, value):
+        """Number of municipalities with a value below ``value`` (binary search)."""
+        _, values, filled = self._groups.get((label, jaar), _EMPTY)
+        return int(np.searchsorted(values[:filled], value, side="left"))
+
+
+def load_ranking(path, **kwargs):
+    """Return the ranking index of a CSV file, rebuilt only when the file changes."""
+    key = ("ranking", path, tuple(sorted(kwargs.items())))
+    return datacache.cache.get(key, lambda: RankingIndex(datacache.read_csv(path, **kwargs)), sources=[path])
@@ -0,0 +1,134 @@
+"""Province and COROP rollups of the indicator cube, with dissolved boundaries.
+
+Municipalities are assigned to regions by ``gebieden.csv``, with the columns
+``statcode``, ``provincie``, ``corop`` and optionally ``inwoners`` (e.g. from
+the CBS table "Gebieden in Nederland" of the geometry's year). A region's
+value is the population-weighted mean over its municipalities with a value;
+without an ``inwoners`` column every municipality weighs the same.
+
+The boundaries are dissolved once per geometry version and lookup file, then
+simplified per zoom tier like the municipality boundaries. Every indicator
+and year is aggregated at once, once per cube version, so switching the
+map's level only looks up cached arrays.
+
+    python rollups.py    # prints the regions per level with timings
+"""
+import os
+import time
+
+import numpy as np
+
+import datacache
+import geostore
+import indicatorcube
+import lod
+
+REGIONS_PATH = "gebieden.csv"
+POPULATION = "inwoners"
+LEVELS = {"provincie": "Provincies", "corop": "COROP-gebieden"}
+
+
+def available(path=REGIONS_PATH):
+    """True when the region lookup file is present."""
+    return os.path.exists(path)
+
+
+def load_regions(path=REGIONS_PATH):
+    """The lookup table in the statcode order of the shared geometry."""
+
+    import pandas as pd
+
+    def load():
+        regions = pd.read_csv(path, dtype={geostore.KEY: str})
+        missing = [column for column in (geostore.KEY, *LEVELS) if column not in regions.columns]
+        if missing:
+            raise ValueError(f"{path} has no column(s) {', '.join(missing)}")
+        statcodes = geostore.load_geometry()[geostore.KEY]
+        unknown = sorted(set(statcodes) - set(regions[geostore.KEY]))
+        if unknown:
+            raise ValueError(f"{path} has no region for {len(unknown)} municipality(ies), e.g. {unknown[:3]}")
+        return regions.drop_duplicates(geostore.KEY).set_index(geostore.KEY).loc[statcodes].reset_index()
+
+    return datacache.cache.get(("regions", path, geostore.geometry_version()), load, sources=[path])
+
+
+class Rollup(indicatorcube.YearSlices):
+    """Weighted means of municipality values per region of one level."""
+
+    def __init__(self, level, regions, cube):
+        self.level = level
+        self.names, membership = np.unique(regions[level].astype(str).to_numpy(), return_inverse=True)
+        weights = (
+            regions[POPULATION].astype(float).to_numpy() if POPULATION in regions.columns
+            else np.ones(len(regions))
+        )
+        # (region, municipality) weights, so a rollup is one matrix product
+        self.matrix = np.zeros((len(self.names), len(regions)))
+        self.matrix[membership, np.arange(len(regions))] = weights
+        self.indicators = list(cube.indicators)
+        self.years = list(cube.years)
+        self.data = self.aggregate(cube.data)
+        self._index(self.indicators, self.years)
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes + self.data.nbytes
+
+    def aggregate(self, values):
+        """Weighted mean per region of ``values`` (municipality, ...), skipping NaN."""
+        values = np.asarray(values, dtype=float)
+        present = ~np.isnan(values)
+        shape = values.shape
+        total = self.matrix @ np.where(present, values, 0.0).reshape(shape[0], -1)
+        weight = self.matrix @ present.reshape(shape[0], -1).astype(float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(weight > 0, total / weight, np.nan)
+        return means.reshape((len(self.names),) + shape[1:])
+
+
+def load_rollup(level, path=REGIONS_PATH):
+    """Return the rollup of the current cube to ``level`` ("provincie" or "corop")."""
+    cube = indicatorcube.load_cube()
+    return datacache.cache.get(
+        ("rollup", level, path, cube.version), lambda: Rollup(level, load_regions(path), cube), sources=[path]
+    )
+
+
+def dissolved(level, path=REGIONS_PATH):
+    """Region boundaries in RD, in the order of ``Rollup.names``."""
+    import shapely
+
+    def dissolve():
+        regions = load_regions(path)
+        geometries = geostore.load_geometry().geometry.to_numpy()
+        names, membership = np.unique(regions[level].astype(str).to_numpy(), return_inverse=True)
+        return np.array([shapely.union_all(geometries[membership == r]) for r in range(len(names))])
+
+    key = ("dissolved", level, path, geostore.geometry_version())
+    return datacache.cache.get(key, dissolve, sources=[path])
+
+
+def encoded_geometry(level, zoom=None, path=REGIONS_PATH):
+    """One pre-encoded WGS84 GeoJSON geometry per region, simplified for ``zoom``."""
+    import shapely
+
+    index = lod.tier_for_zoom(zoom)
+
+    def encode():
+        projected = lod.project_tier(dissolved(level, path), geostore.load_geometry().crs, index)
+        return shapely.to_geojson(projected).tolist()
+
+    key = ("dissolved_geojson", level, path, geostore.geometry_version(), index)
+    return datacache.cache.get(key, encode, sources=[path])
+
+
+if __name__ == "__main__":
+    for level, label in LEVELS.items():
+        start = time.perf_counter()
+        geometries = dissolved(level)
+        dissolve_time = time.perf_counter() - start
+        start = time.perf_counter()
+        rollup = load_rollup(level)
+        print(f"{label}: {len(rollup.names)} regions, dissolved in {dissolve_time:.2f} s, "
+              f"{len(rollup.indicators)} indicators x {len(rollup.years)} years aggregated in "
+              f"{time.perf_counter() - start:.2f} s")
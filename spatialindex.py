@@ -0,0 +1,92 @@
+"""Point-in-municipality lookups on the shared geometry.
+
+An STRtree over the full-detail boundaries, in RD New (EPSG:28992) and in
+WGS84, built once per geometry version. Lookups are batched: pass arrays
+of coordinates and get one municipality per point back.
+
+    spatialindex.statcodes_at(lon, lat)                 # WGS84, x = lon
+    spatialindex.statcodes_at(x, y, crs=28992)          # RD
+    spatialindex.attach_statcode(df, x="lon", y="lat")  # adds a statcode column
+
+From the command line, for a CSV of points:
+
+    python spatialindex.py points.csv --x lon --y lat [--crs 4326] > with_statcode.csv
+"""
+import argparse
+import sys
+from functools import lru_cache
+
+import numpy as np
+import shapely
+
+import geostore
+
+RD_CRS = 28992
+
+
+class SpatialIndex:
+    """STRtree over polygons that maps points to the polygon containing them."""
+
+    def __init__(self, geometries, statcodes):
+        self.geometries = np.asarray(geometries)
+        self.statcodes = np.asarray(statcodes, dtype=object)
+        self.tree = shapely.STRtree(self.geometries)
+        shapely.prepare(self.geometries)
+
+    def lookup(self, x, y):
+        """Position of the polygon containing each point, -1 for points outside all of them."""
+        points = np.atleast_1d(shapely.points(np.asarray(x, dtype=float), np.asarray(y, dtype=float)))
+        # Intersects rather than within, so points on a boundary are found too
+        point_pos, polygon_pos = self.tree.query(points, predicate="intersects")
+        positions = np.full(len(points), -1, dtype=np.intp)
+        # A point on a shared border matches both polygons; the lowest position wins
+        order = np.lexsort((polygon_pos, point_pos))
+        points_found, first = np.unique(point_pos[order], return_index=True)
+        positions[points_found] = polygon_pos[order][first]
+        return positions
+
+    def statcodes_at(self, x, y):
+        """Statcode per point, None for points outside all polygons."""
+        positions = self.lookup(x, y)
+        result = self.statcodes[np.maximum(positions, 0)]
+        result[positions < 0] = None
+        return result
+
+
+@lru_cache(maxsize=2)
+def _build_index(version, crs):
+    if crs == RD_CRS:
+        boundaries = geostore.load_geometry()
+    else:
+        boundaries = geostore.load_geometry_wgs84().boundaries
+    return SpatialIndex(boundaries.geometry.to_numpy(), boundaries[geostore.KEY].to_numpy())
+
+
+def load_index(crs=geostore.WEB_CRS):
+    """Index over the municipality boundaries in RD (28992) or WGS84 (4326)."""
+    if crs not in (RD_CRS, geostore.WEB_CRS):
+        raise ValueError(f"Unsupported CRS {crs!r}, expected {RD_CRS} or {geostore.WEB_CRS}")
+    return _build_index(geostore.geometry_version(), crs)
+
+
+def statcodes_at(x, y, crs=geostore.WEB_CRS):
+    """Statcode of the municipality at each point (x = lon in WGS84), None outside."""
+    return load_index(crs).statcodes_at(x, y)
+
+
+def attach_statcode(df, x="lon", y="lat", crs=geostore.WEB_CRS, column="statcode"):
+    """Return ``df`` with a column holding the statcode at each row's point."""
+    return df.assign(**{column: statcodes_at(df[x].to_numpy(), df[y].to_numpy(), crs)})
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="CSV file with one point per row")
+    parser.add_argument("--x", default="lon", help="x / longitude column (default: lon)")
+    parser.add_argument("--y", default="lat", help="y / latitude column (default: lat)")
+    parser.add_argument("--crs", type=int, default=geostore.WEB_CRS,
+                        help=f"{geostore.WEB_CRS} (WGS84, default) or {RD_CRS} (RD New)")
+    args = parser.parse_args()
+    attach_statcode(pd.read_csv(args.path), args.x, args.y, args.crs).to_csv(sys.stdout, index=False)
@@ -0,0 +1,191 @@
+"""Theme composites computed from the indicator cube.
+
+A theme score is the weighted mean of the theme's indicators after
+normalization: every indicator and year is turned into z-scores over the
+municipalities, with the sign flipped for indicators where a higher value is
+worse (distances, emissions, crime, ...). Indicators without a value for a
+municipality and year are left out of that mean. This is how the ``Nor*``
+and ``Year*`` columns of the ``Theme*.geojson`` files were made, but here it
+runs over all municipalities x themes x years at once and picks up new
+indicator years from the cube.
+
+The themes are the ``Thema`` rows of ``thematicpath.xlsx``; their indicators
+are read from the texts in ``dutchdict.Themes`` ("In dit thema zijn de
+volgende indicatoren opgenomen: ..." for a theme, "onderdeel van het ...
+thema" for an indicator), plus ``EXTRA_MEMBERS`` where those texts are
+incomplete.
+"""
+import hashlib
+import re
+
+import numpy as np
+
+import datacache
+import indicatorcube
+from dutchdict import Themes
+
+THEMES_PATH = "thematicpath.xlsx"
+
+# Indicators where a higher value means less broad prosperity
+NEGATIVE = frozenset({
+    "Overgewicht",
+    "Personen met één of meer langdurige ziekten of aandoeningen",
+    "Werkloosheid",
+    "Gemiddelde schuld per huishouden",
+    "Afstand tot ov",
+    "Afstand tot sportterrein",
+    "Afstand tot basisschool",
+    "Afstand tot café e.d.",
+    "Afstand tot openbaar groen",
+    "Vaak onveilig gevoel in de buurt",
+    "Aantal ondervonden delicten",
+    "Geregistreerde misdrijven",
+    "Emissies van fijnstof naar lucht",
+    "Broeikasgasemissies per inwoner",
+    "Bebouwd terrein",
+    "Fosfaatuitscheiding landbouw",
+    "Stikstofuitscheiding landbouw",
+})
+
+# Spelling of theme names in the indicator texts -> name in thematicpath.xlsx
+THEME_ALIASES = {"Materiële welvaart": "Materiale welvaart"}
+
+# Themes whose texts in dutchdict do not name (all) their indicators
+EXTRA_MEMBERS = {
+    "Materiale welvaart": ["Mediaan vermogen van huishoudens"],
+    "Afstand tot woonvoorzieningen": ["Afstand tot café e.d.", "Afstand tot basisschool", "Afstand tot sportterrein"],
+    "Luchtkwaliteit": ["Emissies van fijnstof naar lucht", "Broeikasgasemissies per inwoner"],
+}
+
+_INCLUDES = re.compile(r"opgenomen:\s*(.+)")
+_PART_OF = re.compile(r"onderdeel van het\s+(.+?)(?:\s+thema)?\s*\.?\s*$", re.MULTILINE)
+
+
+def theme_names(path=THEMES_PATH):
+    """Theme names in the order of ``thematicpath.xlsx``."""
+    return list(dict.fromkeys(datacache.read_excel(path)["Thema"].dropna()))
+
+
+def theme_members(themes, indicators, texts=Themes):
+    """Map every theme to the indicators (of ``indicators``) that belong to it."""
+    members = {theme: set(EXTRA_MEMBERS.get(theme, ())) for theme in themes}
+    for name, text in texts.items():
+        if name in members:
+            match = _INCLUDES.search(text)
+            if match:
+                members[name].update(item.strip() for item in match.group(1).split(","))
+        else:
+            match = _PART_OF.search(text)
+            if match:
+                theme = THEME_ALIASES.get(match.group(1), match.group(1))
+                if theme in members:
+                    members[theme].add(name)
+    # Keep the cube's indicator order so results do not depend on set order
+    return {theme: [name for name in indicators if name in found] for theme, found in members.items()}
+
+
+def normalize(data):
+    """Z-scores over the municipalities (axis 0), per indicator and year; NaN stays NaN."""
+    count = np.count_nonzero(~np.isnan(data), axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nansum(data, axis=0) / count
+        std = np.sqrt(np.nansum((data - mean) ** 2, axis=0) / count)
+        z = (data - mean) / std
+    # A constant indicator carries no information, not an infinite score
+    z[:, std == 0] = np.where(np.isnan(data[:, std == 0]), np.nan, 0.0)
+    return z
+
+
+def composite(z, weights):
+    """Weighted mean over indicators of ``z`` (muni, indicator, year) per row of
+    ``weights`` (theme, indicator); NaN where a theme has no values."""
+    present = ~np.isnan(z)
+    total = np.einsum("mij,ti->mtj", np.where(present, z, 0.0), weights)
+    weight = np.einsum("mij,ti->mtj", present.astype(float), weights)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(weight > 0, total / weight, np.nan)
+
+
+class ThemeScores(indicatorcube.YearSlices):
+    """Theme composites aligned to the cube's statcode order."""
+
+    def __init__(self, cube, members, weights=None):
+        self.statcodes = cube.statcodes
+        self.years = list(cube.years)
+        self.indicators = list(cube.indicators)
+        self.members = {theme: names for theme, names in members.items() if names}
+        self.themes = list(self.members)
+        weights = weights or {}
+
+        sign = np.array([-1.0 if name in NEGATIVE else 1.0 for name in self.indicators])
+        self.normalized = normalize(cube.data) * sign[None, :, None]
+        self.weights = np.zeros((len(self.themes), len(self.indicators)))
+        for t, theme in enumerate(self.themes):
+            for name in self.members[theme]:
+                self.weights[t, self.indicators.index(name)] = weights.get(name, 1.0)
+        self.data = composite(self.normalized, self.weights)
+        # A theme whose indicators have no data keeps using its registry file
+        computed = ~np.isnan(self.data).all(axis=(0, 2))
+        self.themes = [theme for theme, ok in zip(self.themes, computed) if ok]
+        self.members = {theme: self.members[theme] for theme in self.themes}
+        self.weights = self.weights[computed]
+        self.data = self.data[:, computed]
+        self._index(self.themes, self.years)
+        self._member_arrays = {}
+        self.version = hashlib.sha1(
+            f"{cube.version}|{sorted(self.members.items())}|{sorted(weights.items())}".encode()
+        ).hexdigest()
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.normalized.nbytes + self.weights.nbytes
+
+    def _members_matrix(self, theme):
+        arrays = self._member_arrays.get(theme)
+        if arrays is None:
+            positions = [self.indicators.index(name) for name in self.members[theme]]
+            z = self.normalized[:, positions, :]
+            present = ~np.isnan(z)
+            # (municipality, year, indicator), so a reweighting is one matrix-vector product
+            arrays = self._member_arrays[theme] = (
+                np.ascontiguousarray(np.where(present, z, 0.0).transpose(0, 2, 1)),
+                np.ascontiguousarray(present.transpose(0, 2, 1), dtype=float),
+            )
+        return arrays
+
+    def weighted(self, theme, weights):
+        """Scores of a theme for all municipalities x years with other indicator weights.
+
+        ``weights`` maps member indicators to their weight (default 1).
+        """
+        z, present = self._members_matrix(theme)
+        w = np.array([weights.get(name, 1.0) for name in self.members[theme]], dtype=float)
+        total = z @ w
+        weight = present @ w
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(weight > 0, total / weight, np.nan)
+
+
+def load_scores(path=THEMES_PATH):
+    """Return the theme scores of the current cube, recomputed when the cube or theme list changes."""
+    cube = indicatorcube.load_cube()
+
+    def build():
+        return ThemeScores(cube, theme_members(theme_names(path), cube.indicators))
+
+    return datacache.cache.get(("themes", path, cube.version), build, sources=[path])
+
+
+if __name__ == "__main__":
+    import time
+
+    cube = indicatorcube.load_cube()
+    members = theme_members(theme_names(), cube.indicators)
+    start = time.perf_counter()
+    scores = ThemeScores(cube, members)
+    elapsed = time.perf_counter() - start
+    print(f"{len(scores.statcodes)} municipalities x {len(scores.themes)} themes x "
+          f"{len(scores.years)} years in {elapsed * 1000:.1f} ms")
+    for theme, names in members.items():
+        years = ", ".join(scores.available_years(theme)) or "no data, uses its registry file"
+        print(f"  {theme}: {len(names)} indicators ({years})")
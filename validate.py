@@ -0,0 +1,172 @@
+"""Validate every registry entry against its data file, in parallel.
+
+    python validate.py [--report validation.json] [--workers N] [--strict]
+
+Per entry: the file exists (with a suggestion for near-miss names), the CRS
+is EPSG:28992, the statcodes match the reference geometry, and every mapped
+year column exists and is numeric, with its NaN rate and value range. Files
+are checked in a process pool, each worker loading the reference statcodes
+once, so a full pass takes about as long as the slowest file.
+
+The JSON report lists every problem as an error or a warning. The exit
+status is 1 when there are errors (or warnings with ``--strict``), so the
+command can gate a deployment.
+"""
+import argparse
+import difflib
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import geostore
+import indicatorcube
+from registry import file_options
+
+EXPECTED_CRS = "EPSG:28992"
+SENTINEL = indicatorcube.SENTINEL
+
+_reference = None
+
+
+def _init_worker():
+    global _reference
+    _reference = set(geostore.load_geometry()[geostore.KEY])
+
+
+def _suggest(path):
+    candidates = glob.glob(os.path.join(os.path.dirname(path) or ".", "*.geojson"))
+    names = [os.path.basename(candidate) for candidate in candidates]
+    return difflib.get_close_matches(os.path.basename(path), names, n=1, cutoff=0.95)
+
+
+def check_entry(name, info):
+    """Return the validation result of one registry entry."""
+    import geopandas as gpd
+    import pandas as pd
+
+    start = time.perf_counter()
+    result = {"name": name, "path": None, "problems": [], "columns": {}}
+
+    def problem(level, message):
+        result["problems"].append({"level": level, "message": message})
+
+    if info is None:
+        problem("error", "malformed registry entry (needs path and year_columns)")
+    elif not os.path.exists(info["path"]):
+        result["path"] = info["path"]
+        suggestion = _suggest(info["path"])
+        hint = f", did you mean {suggestion[0]}?" if suggestion else ""
+        problem("error", f"file not found: {info['path']}{hint}")
+    else:
+        path = result["path"] = info["path"]
+        crs = gpd.read_file(path, rows=1).crs
+        if crs is None or crs.to_string() != EXPECTED_CRS:
+            problem("error", f"CRS is {crs.to_string() if crs else 'missing'}, expected {EXPECTED_CRS}")
+
+        attributes = gpd.read_file(path, ignore_geometry=True)
+        if geostore.KEY not in attributes.columns:
+            problem("error", f"no {geostore.KEY} column")
+        else:
+            codes = attributes[geostore.KEY]
+            if codes.isna().any():
+                problem("warning", f"{int(codes.isna().sum())} row(s) without {geostore.KEY}")
+            codes = set(codes.dropna())
+            if codes - _reference:
+                problem("error", f"{len(codes - _reference)} statcode(s) not in the reference geometry, "
+                                 f"e.g. {sorted(codes - _reference)[:3]}")
+            if _reference - codes:
+                problem("warning", f"{len(_reference - codes)} municipality(ies) missing, "
+                                   f"e.g. {sorted(_reference - codes)[:3]}")
+            duplicates = int(attributes[geostore.KEY].dropna().duplicated().sum())
+            if duplicates:
+                problem("error", f"{duplicates} duplicate statcode(s)")
+
+        for year, column in info["year_columns"].items():
+            if column not in attributes.columns:
+                problem("error", f"column {column} for {year} not found")
+                continue
+            raw = attributes[column]
+            values = pd.to_numeric(raw, errors="coerce")
+            non_numeric = int((values.isna() & raw.notna()).sum())
+            sentinels = int((values == SENTINEL).sum())
+            values = values.mask(values == SENTINEL)
+            stats = {
+                "column": column,
+                "rows": len(values),
+                "nan_rate": round(float(values.isna().mean()), 4) if len(values) else 1.0,
+                "min": None if values.isna().all() else float(values.min()),
+                "max": None if values.isna().all() else float(values.max()),
+                "non_numeric": non_numeric,
+                "sentinels": sentinels,
+            }
+            result["columns"][year] = stats
+            if non_numeric:
+                problem("error", f"{column} ({year}) has {non_numeric} non-numeric value(s)")
+            if stats["min"] is None:
+                problem("warning", f"{column} ({year}) has no values")
+            if sentinels:
+                problem("warning", f"{column} ({year}) uses {SENTINEL} for {sentinels} missing value(s)")
+
+    levels = {p["level"] for p in result["problems"]}
+    result["status"] = "error" if "error" in levels else "warning" if levels else "ok"
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def _check_safely(name, info):
+    """``check_entry``, with an unreadable file reported as an error of its entry."""
+    start = time.perf_counter()
+    try:
+        return check_entry(name, info)
+    except Exception as e:
+        return {
+            "name": name,
+            "path": info.get("path") if isinstance(info, dict) else None,
+            "problems": [{"level": "error", "message": f"could not be checked: {type(e).__name__}: {e}"}],
+            "columns": {},
+            "status": "error",
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+
+def validate(options=file_options, workers=None):
+    """Check all registry entries; returns the report as a dict."""
+    start = time.perf_counter()
+    entries = list(indicatorcube.registry_entries(options))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        results = list(pool.map(_check_safely, *zip(*entries)))
+    counts = {status: sum(r["status"] == status for r in results) for status in ("ok", "warning", "error")}
+    return {
+        "summary": {
+            "entries": len(results),
+            **counts,
+            "slowest_file_s": max((r["seconds"] for r in results), default=0),
+            "seconds": round(time.perf_counter() - start, 3),
+        },
+        "entries": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--report", default="validation.json", help="JSON report path (default: validation.json)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--strict", action="store_true", help="fail on warnings too")
+    args = parser.parse_args()
+
+    report = validate(workers=args.workers)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1, ensure_ascii=False)
+
+    for entry in report["entries"]:
+        for p in entry["problems"]:
+            print(f"{p['level'].upper():<8} {entry['name']}: {p['message']}")
+    summary = report["summary"]
+    print(f"\n{summary['entries']} entries: {summary['ok']} ok, {summary['warning']} with warnings, "
+          f"{summary['error']} with errors in {summary['seconds']:.1f} s "
+          f"(slowest file {summary['slowest_file_s']:.1f} s). Report: {args.report}")
+    failed = summary["error"] or (args.strict and summary["warning"])
+    sys.exit(1 if failed else 0)